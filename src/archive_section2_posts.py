@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Regenerate the DOU section 2 posts (see `format_todays_section_2.py`)
+of a range of past dates from the manually ranked articles stored in
+'artigos_classificados', e.g. after changing the cleaning rules.
+
+All dates are downloaded with a single BigQuery query, ordered by
+publication date, whose results are read page by page: each day is
+processed and written to its own file (or appended to its week's
+digest) as soon as its last article arrives, so only one day is kept
+in memory at a time.
+
+Usage: archive_section2_posts.py START_DATE END_DATE [--weekly] [--parallel] [--workers N]
+
+START_DATE and END_DATE (format YYYY-MM-DD) are inclusive. Each post
+is written to posts/dou_2_YYYY-MM-DD.txt. With --weekly, the posts of
+each week go to a single digest, posts/dou_2_semana_YYYY-MM-DD.txt,
+named after the week's Monday. With --parallel, the matérias are
+cleaned in a pool of processes (one per CPU, or N with --workers N,
+which implies --parallel) shared by all dates.
+"""
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import datetime as dt
+from itertools import groupby
+import pandas as pd
+
+import auxiliar as aux
+import format_todays_section_2 as f2
+
+
+# Hard-coded:
+orgao_label_path = '../data/correspondencia_orgao_label_DOU_2.csv'
+post_file_prefix = 'posts/dou_2_'
+digest_separator = '\n\n\n'
+
+
+### Funções ###
+
+def ranked_articles_query(start_date, end_date):
+    """
+    Return the query (str) for the manually ranked section 2
+    articles published from `start_date` to `end_date` (dates,
+    inclusive), selected as in `get_ranked_section2`, ordered
+    by publication date.
+    """
+
+    query = """
+    SELECT relevancia, identifica, secao, edicao, data_pub, orgao, ementa, resumo, fulltext, assina, cargo, url
+    FROM `gabinete-compartilhado.executivo_federal_dou.artigos_classificados`
+    WHERE secao = 2
+    AND relevancia IS NOT NULL
+    AND relevancia >= 3
+    AND PARSE_DATE('%%Y-%%m-%%d', data_pub) BETWEEN '%(start)s' AND '%(end)s'
+    ORDER BY data_pub
+    """ % {'start': start_date.strftime('%Y-%m-%d'), 'end': end_date.strftime('%Y-%m-%d')}
+
+    return query
+
+
+def iter_ranked_days(start_date, end_date, page_size=1000):
+    """
+    Run a single BigQuery query for the manually ranked section 2
+    articles published from `start_date` to `end_date` (dates,
+    inclusive) and generate, for each day with articles, a tuple
+    (date, DataFrame of the day's articles). The results are read
+    `page_size` (int) rows at a time, so only the current day is
+    kept in memory.
+    """
+
+    bq   = aux.get_bigquery_client()
+    rows = bq.query(ranked_articles_query(start_date, end_date), location="US").result(page_size=page_size)
+
+    for data_pub, day_rows in groupby(rows, key=lambda r: str(r['data_pub'])):
+        post_date = dt.datetime.strptime(data_pub[:10], '%Y-%m-%d').date()
+        yield post_date, pd.DataFrame([dict(r.items()) for r in day_rows])
+
+
+def digest_filename(post_date, prefix=post_file_prefix):
+    """
+    Return the filename (str) of the weekly digest that
+    includes the post of `post_date` (date), named after
+    the Monday of its week.
+    """
+
+    monday = post_date - dt.timedelta(days=post_date.weekday())
+
+    return f2.gen_post_filename(prefix + 'semana_', monday)
+
+
+def archive_posts(start_date, end_date, weekly=False, prefix=post_file_prefix, verbose=False,
+                  parallel=False, n_workers=None):
+    """
+    Regenerate the section 2 posts of the dates from `start_date`
+    to `end_date` (dates, inclusive) and write them to files.
+
+    Input
+    -----
+    start_date : date
+        The first publication date.
+    end_date : date
+        The last publication date.
+    weekly : bool
+        Whether to write the posts of each week to a single
+        digest (see `digest_filename`) instead of one file
+        per day.
+    prefix : str
+        Path and start of the files' names.
+    verbose : bool
+        Whether or not to print log messages along the funcion
+        execution.
+    parallel : bool
+        Whether to clean the matérias in a pool of processes
+        (see `f2.prepare_materias_in_chunks`), started once and
+        shared by all dates.
+    n_workers : int or None
+        Number of processes in the pool if `parallel` is True.
+        If None, use one per CPU.
+
+    Return
+    ------
+    filenames : list of str
+        The files written, in order.
+    """
+
+    orgao_label = pd.read_csv(orgao_label_path)
+
+    filenames = []
+    media     = None
+    executor  = ProcessPoolExecutor(max_workers=n_workers) if parallel else None
+    try:
+        for post_date, articles_df in iter_ranked_days(start_date, end_date):
+            if verbose:
+                print(post_date.strftime('%Y-%m-%d') + ': ' + str(len(articles_df)) + ' matérias')
+            message_df = f2.process_ranked_articles(articles_df, orgao_label, parallel=parallel,
+                                                    n_workers=n_workers, executor=executor)
+
+            # Open the day's file or, for a new week, its digest:
+            filename = digest_filename(post_date, prefix) if weekly else f2.gen_post_filename(prefix, post_date)
+            if len(filenames) > 0 and filenames[-1] == filename:
+                media.write(digest_separator)
+            else:
+                if media != None:
+                    media.close()
+                media = open(filename, 'w')
+                filenames.append(filename)
+
+            f2.write_post(media, message_df, orgao_label, post_date=post_date)
+    finally:
+        if media != None:
+            media.close()
+        if executor != None:
+            executor.shutdown()
+
+    return filenames
+
+
+def main(args=['script_filename']):
+    """
+    Function that runs this file as a script.
+    `args` (list of str) can be passed to it
+    using sys.argv. Set `n_args` below to
+    the number of arguments the script accepts.
+    """
+    # Hard-coded:
+    n_args = [2]
+
+    # Get options:
+    weekly   = '--weekly' in args
+    parallel = '--parallel' in args
+    args     = [a for a in args if a not in ('--weekly', '--parallel')]
+    n_workers = None
+    if '--workers' in args:
+        i = args.index('--workers')
+        if i + 1 >= len(args) or not args[i + 1].isdigit() or int(args[i + 1]) < 1:
+            print(__doc__)
+            sys.exit(1)
+        n_workers = int(args[i + 1])
+        parallel  = True
+        args      = args[:i] + args[i + 2:]
+
+    # Docstring output:
+    if len(args) - 1 not in n_args:
+        print(__doc__)
+        sys.exit(1)
+
+    # START OF SCRIPT:
+    start_date = dt.datetime.strptime(args[1], '%Y-%m-%d').date()
+    end_date   = dt.datetime.strptime(args[2], '%Y-%m-%d').date()
+    filenames  = archive_posts(start_date, end_date, weekly=weekly, verbose=True,
+                               parallel=parallel, n_workers=n_workers)
+    print('Wrote ' + str(len(filenames)) + ' files.')
+
+
+# If running this code as a script:
+if __name__ == '__main__':
+    main(sys.argv)
@@ -10,9 +10,14 @@ import streamlit as st
 import boto3
 import os
 import json
+import threading
+import datetime as dt
 import google.auth as ga
 from google.oauth2.service_account import Credentials
 from google.auth.exceptions import DefaultCredentialsError
+from google.auth.transport.requests import Request
+from google.cloud import bigquery
+from google.cloud import storage
 
 
 
@@ -107,11 +112,8 @@ def get_s3_file(bucket, key, decode=False):
         or as a string (if `decode` is True).
     """
     
-    # Instantiate client with credentials:
-    credentials = load_aws_credentials()
-    s3 = boto3.client('s3', 
-                      aws_access_key_id=credentials['aws_access_key_id'], 
-                      aws_secret_access_key=credentials['aws_secret_access_key'])
+    # Get shared client with credentials:
+    s3 = get_aws_client('s3')
     
     #a  = s3.get_object(Bucket='config-lambda', 
     #                   Key='layers/google-cloud-storage/gabinete-compartilhado.json')
@@ -182,3 +184,116 @@ def load_gcp_credentials(credentials_file='/home/skems/gabinete/projetos/keys-co
         credentials = load_gcp_credentials_from_s3()
 
     return credentials
+
+
+### Shared credentials and clients ###
+
+# Process-wide pool, shared by all threads:
+pool_lock  = threading.RLock()
+pool       = {}
+pool_local = threading.local()
+
+
+def get_aws_session():
+    """
+    Return a boto3 Session with the AWS credentials, 
+    loaded only on the first call.
+    """
+    
+    with pool_lock:
+        if 'aws_session' not in pool:
+            credentials = load_aws_credentials()
+            pool['aws_session'] = boto3.session.Session(aws_access_key_id=credentials['aws_access_key_id'], 
+                                                        aws_secret_access_key=credentials['aws_secret_access_key'])
+        return pool['aws_session']
+
+
+def get_aws_client(service, region_name=None):
+    """
+    Return a boto3 client for the AWS `service` (str) in 
+    `region_name` (str or None), created only on the first
+    call. Clients are thread-safe, so the same one is 
+    handed out to all threads.
+    """
+    
+    key = ('aws_client', service, region_name)
+    with pool_lock:
+        if key not in pool:
+            pool[key] = get_aws_session().client(service, region_name=region_name)
+        return pool[key]
+
+
+def get_aws_resource(service, region_name=None):
+    """
+    Return a boto3 resource for the AWS `service` (str) in 
+    `region_name` (str or None). Resources are not thread-safe,
+    so each thread gets (and reuses) its own.
+    """
+    
+    key = (service, region_name)
+    if not hasattr(pool_local, 'resources'):
+        pool_local.resources = {}
+    if key not in pool_local.resources:
+        with pool_lock:
+            pool_local.resources[key] = get_aws_session().resource(service, region_name=region_name)
+    
+    return pool_local.resources[key]
+
+
+def get_gcp_credentials(credentials_file='/home/skems/gabinete/projetos/keys-configs/gabinete-compartilhado.json', 
+                        refresh_margin=300):
+    """
+    Return GCP credentials, loaded (see `load_gcp_credentials`)
+    only on the first call. The access token is refreshed 
+    whenever it is missing or is going to expire in less than
+    `refresh_margin` seconds.
+    
+    Loading and refreshing (network calls) are done under a 
+    lock of these credentials only, so they do not block the 
+    threads getting other clients from the pool.
+    """
+    
+    key = ('gcp_credentials', credentials_file)
+    with pool_lock:
+        if key not in pool:
+            pool[key] = {'lock': threading.Lock(), 'credentials': None}
+        entry = pool[key]
+    
+    with entry['lock']:
+        if entry['credentials'] == None:
+            entry['credentials'] = load_gcp_credentials(credentials_file)
+        credentials = entry['credentials']
+        
+        # Refresh token before it expires:
+        if credentials.expiry == None or credentials.expiry - dt.datetime.utcnow() < dt.timedelta(seconds=refresh_margin):
+            credentials.refresh(Request())
+    
+    return credentials
+
+
+def get_bigquery_client(project='gabinete-compartilhado'):
+    """
+    Return a Google BigQuery client for `project` (str), 
+    created only on the first call, with fresh credentials.
+    """
+    
+    credentials = get_gcp_credentials()
+    key = ('bigquery_client', project)
+    with pool_lock:
+        if key not in pool:
+            pool[key] = bigquery.Client(credentials=credentials, project=project)
+        return pool[key]
+
+
+def get_storage_client(project='gabinete-compartilhado'):
+    """
+    Return a Google Storage client for `project` (str), 
+    created only on the first call, with fresh credentials.
+    """
+    
+    credentials = get_gcp_credentials()
+    key = ('storage_client', project)
+    with pool_lock:
+        if key not in pool:
+            pool[key] = storage.Client(project=project, credentials=credentials)
+        return pool[key]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the DOU article counting pipeline (count_DOU_articles.py)
+offline, over backend responses recorded to a cassette file.
+
+Usage: 
+    benchmark_counts.py record CASSETTE
+    benchmark_counts.py replay CASSETTE [LATENCY_SCALE [N_RUNS]]
+
+'record' runs the pipeline against the real backends (once in each 
+mode) and saves their responses (and latencies) to the JSON file CASSETTE. 'replay' 
+runs the pipeline N_RUNS times (default 3) in sequential and in 
+concurrent mode over the recorded responses, each backend call taking 
+its recorded time multiplied by LATENCY_SCALE (default 1), and prints 
+the mean time taken by each stage and by the whole pipeline.
+"""
+
+import sys
+import time
+import pandas as pd
+
+import count_DOU_articles as ca
+import cassette as cc
+
+
+### Funções ###
+
+def time_pipeline(concurrent, n_runs=3):
+    """
+    Run `count_DOU_articles.count_through_pipeline` `n_runs` 
+    (int) times, concurrently or not (`concurrent`, bool), 
+    and return a Series with the mean time (in seconds) 
+    taken by each stage and by the whole pipeline ('Total').
+    Raises ValueError if `n_runs` is less than 1.
+    """
+    
+    if n_runs < 1:
+        raise ValueError('The number of runs must be at least 1, got {}.'.format(n_runs))
+    
+    runs = []
+    for i in range(n_runs):
+        durations = {}
+        start = time.time()
+        df, error_msgs = ca.count_through_pipeline(concurrent=concurrent, durations=durations)
+        durations['Total'] = time.time() - start
+        runs.append(durations)
+    
+    # Failed stages (e.g. calls missing from the cassette) are not timed properly:
+    for msg in error_msgs:
+        print(msg)
+    
+    return pd.DataFrame(runs).mean()
+
+
+def benchmark_pipeline(cassette_path, latency_scale=1.0, n_runs=3):
+    """
+    Replay the backend responses recorded in `cassette_path` 
+    (str), with latencies multiplied by `latency_scale` (float),
+    and return a DataFrame with the mean time (in seconds) taken 
+    by each stage and by the whole pipeline, over `n_runs` (int)
+    runs, in sequential and concurrent modes.
+    """
+    
+    with cc.replaying(cassette_path, latency_scale=latency_scale):
+        timings = pd.DataFrame({'Sequencial':  time_pipeline(False, n_runs), 
+                                'Concorrente': time_pipeline(True, n_runs)})
+    
+    return timings
+
+
+def main(args=['script_filename']):
+    """
+    Function that runs this file as a script.
+    `args` (list of str) can be passed to it 
+    using sys.argv.
+    """
+    
+    # Docstring output:
+    if len(args) < 3 or args[1] not in ['record', 'replay'] or len(args) > 5: 
+        print(__doc__)
+        sys.exit(1)
+
+    # START OF SCRIPT:
+    
+    cassette_path = args[2]
+    
+    if args[1] == 'record':
+        # Both modes are recorded since they make different backend calls:
+        with cc.recording(cassette_path) as cassette:
+            ca.count_through_pipeline(concurrent=False)
+            df, error_msgs = ca.count_through_pipeline(concurrent=True)
+        print(df)
+        for msg in error_msgs:
+            print(msg)
+        print('Recorded {} backend calls to {}.'.format(len(cassette['calls']), cassette_path))
+    
+    else:
+        latency_scale = float(args[3]) if len(args) > 3 else 1.0
+        n_runs        = int(args[4]) if len(args) > 4 else 3
+        if n_runs < 1:
+            print('N_RUNS must be at least 1.')
+            sys.exit(1)
+        timings = benchmark_pipeline(cassette_path, latency_scale, n_runs)
+        timings['Ganho'] = timings['Sequencial'] / timings['Concorrente']
+        print(timings.to_string(float_format='{:.3f}'.format))
+
+
+# If running this code as a script:
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the processing of DOU section 2 articles
+(format_todays_section_2.py): compare the time taken by the
+current implementation of each processing stage with the
+step-by-step one it replaced, checking that both produce the
+same output.
+
+Usage: benchmark_section2.py [--parallel] [ARTICLES_CSV [N_RUNS]]
+
+ARTICLES_CSV is a CSV file with section 2 articles (columns
+'fulltext', 'orgao' and 'url', at least), e.g. a year of
+'artigos_classificados'. If not given, the test sample of
+`get_ranked_section2(test=True)` is used. N_RUNS (default 3)
+is the number of times each implementation is run.
+
+With --parallel, time instead the whole processing of the
+articles (`process_ranked_articles`) done serially and with
+the matérias cleaned in pools of 1, 2, 4... processes, up to
+the number of CPUs, checking that all give the same output.
+"""
+
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+import pandas as pd
+
+import format_todays_section_2 as f2
+
+
+# Hard-coded:
+act_regex        = r'(nomear|designar|exonerar|dispensar)(?!(?:am|á|ão|em))'
+orgao_label_path = '../data/correspondencia_orgao_label_DOU_2.csv'
+
+
+### Funções ###
+
+def clean_acts_by_steps(text_series):
+    """
+    Clean the acts in `text_series` (Pandas Series) with one
+    `Series.str.replace` pass per rule, as done before
+    `format_todays_section_2.clean_acts`.
+    """
+
+    cleaned_acts = text_series
+    cleaned_acts = f2.remove_siape(cleaned_acts)
+    cleaned_acts = f2.remove_cpf(cleaned_acts)
+    cleaned_acts = f2.remove_no(cleaned_acts)
+    cleaned_acts = f2.remove_processo(cleaned_acts)
+    cleaned_acts = f2.fix_verbs(cleaned_acts)
+    cleaned_acts = f2.standardize_cargos(cleaned_acts)
+    cleaned_acts = f2.simplify_cargo_preamble(cleaned_acts)
+    cleaned_acts = name_to_sigla_by_steps(cleaned_acts)
+    cleaned_acts = f2.remove_dates(cleaned_acts)
+
+    return cleaned_acts
+
+
+def name_to_sigla_by_steps(text_series):
+    """
+    Replace the órgão names in `text_series` (Pandas Series) 
+    by their acronyms with one `Series.str.replace` pass per 
+    órgão, as done before `format_todays_section_2.name_to_sigla`.
+    """
+
+    new_text_series = text_series.copy()
+    for name, acronym in f2.orgao_sigla:
+        new_text_series = new_text_series.str.replace(f2.prep_orgao_regex(name, acronym), acronym, case=False)
+
+    return new_text_series
+
+
+def add_label_by_rules(df, orgao_label_df, lookup_col='orgao', label_col='label', input_label=None):
+    """
+    Return a copy of `df` (DataFrame) labelled as in 
+    `format_todays_section_2.add_label_to_df`, but with one
+    full `Series.str.contains` pass per rule, as done before.
+    """
+
+    df = df.copy()
+    if input_label == None:
+        df[label_col] = None
+    elif type(input_label) == str:
+        input_label = [input_label]
+
+    for i in range(len(orgao_label_df)):
+        regex = orgao_label_df.loc[i, 'regex']
+        label = orgao_label_df.loc[i, 'label']
+        if input_label == None:
+            df.loc[df[lookup_col].str.contains(regex) & df[label_col].isnull(), label_col] = label
+        else:
+            df.loc[df[lookup_col].str.contains(regex) & df[label_col].isin(input_label), label_col] = label
+
+    return df
+
+
+def add_label_by_index(df, orgao_label_df, lookup_col='orgao', label_col='label', input_label=None):
+    """
+    Return a copy of `df` (DataFrame) labelled by 
+    `format_todays_section_2.add_label_to_df`.
+    """
+
+    df = df.copy()
+    f2.add_label_to_df(df, orgao_label_df, lookup_col, label_col, input_label)
+
+    return df
+
+
+def relabel_by_text_two_pass(message_df, orgao_label):
+    """
+    Return a copy of `message_df` (DataFrame) relabelled as in
+    `format_todays_section_2.relabel_by_text`, but with the 
+    órgão and minister rules applied in two separate passes of 
+    one `Series.str.contains` per rule, as done before.
+    """
+
+    input_label    = ['Atos do Executivo', 'Presidência']
+    message_df     = add_label_by_rules(message_df, orgao_label, 'text', 'section', input_label)
+    ministro_label = f2.gen_minister_regex(orgao_label)
+    message_df     = add_label_by_rules(message_df, ministro_label, 'text', 'section', input_label)
+
+    return message_df
+
+
+def relabel_by_text_single_pass(message_df, orgao_label):
+    """
+    Return a copy of `message_df` (DataFrame) relabelled by
+    `format_todays_section_2.relabel_by_text`.
+    """
+
+    message_df = message_df.copy()
+    f2.relabel_by_text(message_df, orgao_label)
+
+    return message_df
+
+
+def classify_acts_by_rules(text_series):
+    """
+    Return a DataFrame with the importance and emoji of each
+    act in `text_series` (Series of str), computed row by row
+    with `act_importance` and `assign_emoji`, as done before
+    `format_todays_section_2.classify_acts`.
+    """
+
+    return pd.DataFrame({'importance': text_series.apply(f2.act_importance), 
+                         'emoji':      text_series.apply(f2.assign_emoji)})
+
+
+def time_function(func, args, n_runs=3):
+    """
+    Run `func(*args)` `n_runs` (int) times and return the
+    mean time taken (in seconds) and the last result.
+    """
+
+    start = time.time()
+    for i in range(n_runs):
+        result = func(*args)
+
+    return (time.time() - start) / n_runs, result
+
+
+def compare(stage, old_func, new_func, args, n_runs=3):
+    """
+    Time the implementations `old_func` and `new_func` of a
+    processing `stage` (str) over `args` (tuple), check that
+    their results are equal and return a dict with the stage
+    name, the times and whether the results match.
+    """
+
+    old_time, old_result = time_function(old_func, args, n_runs)
+    new_time, new_result = time_function(new_func, args, n_runs)
+
+    if isinstance(old_result, (pd.Series, pd.DataFrame)):
+        same = old_result.equals(new_result) and (old_result.index == new_result.index).all()
+    else:
+        same = old_result == new_result
+
+    return {'Estágio': stage, 'Antes (s)': old_time, 'Depois (s)': new_time,
+            'Ganho': old_time / new_time, 'Idêntico': same}
+
+
+def benchmark_section2(articles_df, orgao_label, n_runs=3):
+    """
+    Compare the old and new implementations of the processing
+    stages of the DOU section 2 `articles_df` (DataFrame) and
+    return a DataFrame with the results, one row per stage.
+    `orgao_label` (DataFrame) is the órgão-label table.
+    """
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        # Órgão labels:
+        results = [compare('Rótulo do órgão', add_label_by_rules, add_label_by_index, 
+                           (articles_df[['orgao']], orgao_label), n_runs)]
+
+        # Acts to be cleaned:
+        with_acts  = articles_df.loc[articles_df['fulltext'].str.contains(act_regex, case=False), 'fulltext']
+        raw_acts   = f2.filter_low_cargos(f2.isolate_acts(with_acts, act_regex))
+
+        results.append(compare('Limpeza dos atos', clean_acts_by_steps, f2.clean_acts, (raw_acts,), n_runs))
+        results.append(compare('Siglas dos órgãos', name_to_sigla_by_steps, f2.name_to_sigla, (raw_acts,), n_runs))
+
+        # Relabelling of the acts by órgãos and ministers in their text:
+        labelled_df = add_label_by_index(articles_df, orgao_label)
+        message_df  = f2.build_message_df(f2.clean_acts(raw_acts), labelled_df)
+        results.append(compare('Importância e emoji', classify_acts_by_rules, f2.classify_acts, 
+                               (message_df['text'],), n_runs))
+        results.append(compare('Rótulo pelo texto', relabel_by_text_two_pass, relabel_by_text_single_pass, 
+                               (message_df, orgao_label), n_runs))
+
+    return pd.DataFrame(results).set_index('Estágio')
+
+
+def process_articles_copy(articles_df, orgao_label, parallel=False, n_workers=None, executor=None):
+    """
+    Run `format_todays_section_2.process_ranked_articles` on a
+    copy of `articles_df` (DataFrame), which it modifies.
+    """
+
+    return f2.process_ranked_articles(articles_df.copy(), orgao_label, parallel=parallel,
+                                      n_workers=n_workers, executor=executor)
+
+
+def benchmark_parallel(articles_df, orgao_label, n_workers_list=None, n_runs=3):
+    """
+    Compare the time taken to process the DOU section 2 
+    `articles_df` (DataFrame) serially and with the matérias 
+    cleaned in pools of each number of processes in 
+    `n_workers_list` (list of int; if None, powers of 2 up to 
+    the number of CPUs). Each pool is started and warmed up 
+    before being timed, as it is shared by all dates in 
+    `archive_section2_posts.py`. Return a DataFrame with the 
+    results, one row per number of processes (0 is the serial 
+    run). `orgao_label` (DataFrame) is the órgão-label table.
+    """
+
+    if n_workers_list == None:
+        n_cpus = os.cpu_count()
+        n_workers_list = [2 ** i for i in range(n_cpus.bit_length()) if 2 ** i <= n_cpus]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        serial_time, serial_result = time_function(process_articles_copy, (articles_df, orgao_label), n_runs)
+        results = [{'Processos': 0, 'Tempo (s)': serial_time, 'Ganho': 1.0, 'Idêntico': True}]
+
+        for n_workers in n_workers_list:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                args = (articles_df, orgao_label, True, n_workers, executor)
+                process_articles_copy(*args)
+                parallel_time, parallel_result = time_function(process_articles_copy, args, n_runs)
+            results.append({'Processos': n_workers, 'Tempo (s)': parallel_time, 'Ganho': serial_time / parallel_time,
+                            'Idêntico': serial_result.equals(parallel_result)})
+
+    return pd.DataFrame(results).set_index('Processos')
+
+
+def main(args=['script_filename']):
+    """
+    Function that runs this file as a script.
+    `args` (list of str) can be passed to it
+    using sys.argv. Set `n_args` below to
+    the number of arguments the script accepts.
+    """
+    # Hard-coded:
+    n_args = [0, 1, 2]
+
+    # Get options:
+    parallel = '--parallel' in args
+    args     = [a for a in args if a != '--parallel']
+
+    # Docstring output:
+    if len(args) - 1 not in n_args:
+        print(__doc__)
+        sys.exit(1)
+
+    # START OF SCRIPT:
+    if len(args) == 1:
+        articles_df = f2.get_ranked_section2(test=True)
+    else:
+        articles_df = pd.read_csv(args[1])
+    n_runs = 3 if len(args) < 3 else int(args[2])
+
+    orgao_label = pd.read_csv(orgao_label_path)
+
+    print('# matérias:', len(articles_df))
+    if parallel:
+        print(benchmark_parallel(articles_df, orgao_label, n_runs=n_runs).to_string())
+    else:
+        print(benchmark_section2(articles_df, orgao_label, n_runs).to_string())
+
+
+# If running this code as a script:
+if __name__ == '__main__':
+    main(sys.argv)
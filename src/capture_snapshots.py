@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Append-only local store (SQLite) of the article counts along the
+DOU capture pipeline, as computed by
+`count_DOU_articles.count_through_pipeline()`.
+
+Each run of the pipeline adds one row per step and column of the
+counts table (sections, total, etc.), along with the time taken by
+the step. This allows following the capture progress along the
+morning without querying the pipeline backends again.
+"""
+
+import os
+import sqlite3
+import pandas as pd
+
+import count_DOU_articles as ca
+
+
+# Hard-coded:
+default_db_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'data', 'capture_snapshots.db')
+
+
+### Funções ###
+
+def connect(db_path=default_db_path):
+    """
+    Open the SQLite database in `db_path` (str), creating
+    the counts table and its indices if needed, and return
+    the connection.
+    """
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS counts (
+        run_time TEXT    NOT NULL,
+        data_pub TEXT    NOT NULL,
+        stage    TEXT    NOT NULL,
+        section  TEXT    NOT NULL,
+        count    INTEGER NOT NULL,
+        duration REAL
+    )""")
+    conn.execute('CREATE INDEX IF NOT EXISTS counts_date_stage ON counts (data_pub, stage, run_time)')
+
+    return conn
+
+
+def save_snapshot(counts_df, durations, data_pub, run_time, db_path=default_db_path):
+    """
+    Append the article counts of a capture pipeline run to
+    the store.
+
+    Input
+    -----
+    counts_df : DataFrame
+        The counts for each section (columns) and pipeline step
+        (index), as returned by `count_through_pipeline()`.
+        Negative values (unavailable or failed counts) are not
+        stored.
+    durations : dict
+        The time (in seconds) taken by each pipeline step,
+        keyed by step name.
+    data_pub : datetime
+        The DOU publication date the counts refer to.
+    run_time : datetime
+        The time the counts were computed (Brasilia time).
+    db_path : str
+        Path to the SQLite database file.
+    """
+
+    data_pub_str = data_pub.strftime('%Y-%m-%d')
+    run_time_str = run_time.strftime('%Y-%m-%d %H:%M:%S')
+
+    rows = []
+    for stage, stage_counts in counts_df.iterrows():
+        for section, count in stage_counts.items():
+            if count >= 0:
+                rows.append((run_time_str, data_pub_str, stage, section, int(count), durations.get(stage)))
+
+    conn = connect(db_path)
+    with conn:
+        conn.executemany('INSERT INTO counts VALUES (?, ?, ?, ?, ?, ?)', rows)
+    conn.close()
+
+
+def load_snapshots(data_pub, stage=None, db_path=default_db_path):
+    """
+    Return a DataFrame with all stored counts for the DOU
+    publication date `data_pub` (datetime), optionally
+    restricted to the pipeline step `stage` (str), sorted
+    by run time.
+    """
+
+    query  = 'SELECT run_time, stage, section, count, duration FROM counts WHERE data_pub = ?'
+    params = [data_pub.strftime('%Y-%m-%d')]
+    if stage != None:
+        query = query + ' AND stage = ?'
+        params.append(stage)
+    query = query + ' ORDER BY run_time'
+
+    conn = connect(db_path)
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+
+    return df
+
+
+def catch_up_times(data_pub, reference='Site', section='Total', db_path=default_db_path):
+    """
+    For each pipeline step stored for the DOU publication date
+    `data_pub` (datetime), find the first run in which the step's
+    count in `section` (str) reached the count of the `reference`
+    step (str) stored at the same time or right before it (steps
+    may be counted at different times). The steps whose counts
+    are not comparable to the reference's (see 
+    `count_DOU_articles.growth_steps`) are left out.
+
+    Returns a DataFrame indexed by step, with the first run time
+    the reference was reached ('reached_at', None if never) and
+    the step's and reference's counts in the last run ('count'
+    and 'reference_count').
+    """
+
+    query = """
+    SELECT s.stage, s.run_time, s.count,
+           (SELECT r.count FROM counts AS r
+            WHERE r.data_pub = s.data_pub AND r.stage = ? 
+              AND r.section  = s.section  AND r.run_time <= s.run_time
+            ORDER BY r.run_time DESC LIMIT 1) AS reference_count
+    FROM counts AS s
+    WHERE s.data_pub = ? AND s.section = ? AND s.stage != ?
+      AND s.stage NOT IN (%(growth_steps)s)
+    ORDER BY s.run_time
+    """ % {'growth_steps': ', '.join(['?'] * len(ca.growth_steps))}
+    params = [reference, data_pub.strftime('%Y-%m-%d'), section, reference] + ca.growth_steps
+
+    conn = connect(db_path)
+    runs = pd.read_sql_query(query, conn, params=params).dropna(subset=['reference_count'])
+    conn.close()
+
+    # First run in which each step reached the reference:
+    reached = runs.loc[runs['count'] >= runs['reference_count']].groupby('stage', sort=False)['run_time'].first()
+    # Last run of each step:
+    last = runs.groupby('stage', sort=False)[['count', 'reference_count']].last()
+    last['reached_at'] = reached
+
+    return last
+
+
+def trend_messages(data_pub, reference='Site', db_path=default_db_path):
+    """
+    Return a list of str describing, for each pipeline step stored
+    for the DOU publication date `data_pub` (datetime), when it
+    reached the total count of the `reference` step (str) or how
+    far from it the step was in the last run.
+    """
+
+    trends = catch_up_times(data_pub, reference, db_path=db_path)
+
+    messages = []
+    for stage, row in trends.iterrows():
+        if pd.notnull(row['reached_at']):
+            messages.append('{} alcançou o total do {} às {}'.format(stage, reference, row['reached_at'][11:16]))
+        else:
+            messages.append('{}: {} de {} matérias'.format(stage, row['count'], row['reference_count']))
+
+    return messages
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Record and replay the responses of the backends used by
+`count_DOU_articles.py` (imprensa oficial website, DynamoDB, S3,
+Google Storage and BigQuery), so the counting pipeline can be
+benchmarked and profiled offline.
+
+While recording, every backend call made by `count_DOU_articles`
+goes to the real backend and its result (and the time it took) is
+saved to a JSON file (the cassette). While replaying, the same calls
+return the saved results, after sleeping for a configurable latency,
+without network access.
+"""
+
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import datetime as dt
+
+import count_DOU_articles as ca
+
+
+# Hard-coded backend calls of `count_DOU_articles`: function name ->
+# (number of leading arguments that identify the call, result decoder):
+backend_calls = {'get_leiturajornal_params':  (2, None),
+                 'count_dynamo_items':        (2, None),
+                 'list_dynamo_items':         (1, None),
+                 'count_s3_files_by_section': (3, Counter),
+                 'list_s3_files':             (2, None),
+                 'count_blobs_with_prefix':   (2, None),
+                 'count_blobs_by_section':    (2, Counter),
+                 'list_blobs_with_prefix':    (3, None),
+                 'query_bigquery':            (1, None)}
+
+# Default arguments of the backend calls (so calls with and without them match):
+default_args = {'count_dynamo_items': (4,), 'count_s3_files_by_section': (None,), 'list_blobs_with_prefix': (None,)}
+
+
+### Funções ###
+
+def call_key(func_name, args, kwargs={}):
+    """
+    Return a str that identifies the call of the backend
+    function `func_name` (str) with positional arguments 
+    `args` (tuple) and keyword arguments `kwargs` (dict).
+    """
+
+    n_key_args, decoder = backend_calls[func_name]
+    defaults = default_args.get(func_name, ())
+    
+    # Fill in the default arguments that were not passed:
+    n_required = n_key_args - len(defaults)
+    if len(args) < n_key_args:
+        args = tuple(args) + defaults[len(args) - n_required:]
+    
+    key_args = [a.strftime('%Y-%m-%d') if isinstance(a, dt.datetime) else str(a) for a in args[:n_key_args]]
+    key_args = key_args + [k + '=' + str(v) for k, v in sorted(kwargs.items())]
+
+    return func_name + '(' + ', '.join(key_args) + ')'
+
+
+def patch_backends(wrapper):
+    """
+    Replace every backend function in `count_DOU_articles`
+    by `wrapper(func_name, func)` and return a dict with the
+    original functions, keyed by name.
+    """
+
+    originals = {}
+    for func_name in backend_calls:
+        originals[func_name] = getattr(ca, func_name)
+        setattr(ca, func_name, wrapper(func_name, originals[func_name]))
+
+    return originals
+
+
+def restore_backends(originals):
+    """
+    Put back in `count_DOU_articles` the `originals` (dict)
+    functions replaced by `patch_backends`.
+    """
+
+    for func_name, func in originals.items():
+        setattr(ca, func_name, func)
+
+
+@contextmanager
+def recording(cassette_path):
+    """
+    Context manager that records every backend call made by
+    `count_DOU_articles` inside it to the JSON file
+    `cassette_path` (str), along with today's date.
+    """
+
+    cassette = {'date': ca.brasilia_day().strftime('%Y-%m-%d'), 'calls': {}}
+    lock = threading.Lock()
+
+    def wrapper(func_name, func):
+        def recorder(*args, **kwargs):
+            start  = time.time()
+            result = func(*args, **kwargs)
+            with lock:
+                cassette['calls'][call_key(func_name, args, kwargs)] = {'result': result, 'elapsed': time.time() - start}
+            return result
+        return recorder
+
+    originals = patch_backends(wrapper)
+    try:
+        yield cassette
+    finally:
+        restore_backends(originals)
+        with open(cassette_path, 'w') as f:
+            json.dump(cassette, f, ensure_ascii=False, default=str)
+
+
+@contextmanager
+def replaying(cassette_path, latency_scale=1.0, extra_latency=0.0):
+    """
+    Context manager that answers every backend call made by
+    `count_DOU_articles` inside it with the results recorded
+    in the JSON file `cassette_path` (str), as if today were
+    the recording date.
+
+    Each call sleeps for the time it took when recorded, times
+    `latency_scale` (float), plus `extra_latency` (float, in
+    seconds). Calls not found in the cassette raise KeyError.
+    """
+
+    with open(cassette_path, 'r') as f:
+        cassette = json.load(f)
+    recorded_date = dt.datetime.strptime(cassette['date'], '%Y-%m-%d')
+
+    def wrapper(func_name, func):
+        decoder = backend_calls[func_name][1]
+        def replayer(*args, **kwargs):
+            key = call_key(func_name, args, kwargs)
+            if key not in cassette['calls']:
+                raise KeyError('Call not found in cassette: ' + key)
+            call = cassette['calls'][key]
+            time.sleep(call['elapsed'] * latency_scale + extra_latency)
+            return call['result'] if decoder == None else decoder(call['result'])
+        return replayer
+
+    originals = patch_backends(wrapper)
+    # Freeze the date and avoid creating a real Storage client:
+    original_day    = ca.brasilia_day
+    original_client = ca.aux.get_storage_client
+    ca.brasilia_day = lambda yesterday=False: recorded_date - dt.timedelta(days=int(yesterday))
+    ca.aux.get_storage_client = lambda project='gabinete-compartilhado': None
+    try:
+        yield cassette
+    finally:
+        restore_backends(originals)
+        ca.brasilia_day = original_day
+        ca.aux.get_storage_client = original_client
@@ -13,33 +13,55 @@ in the following places:
 The count '-1' means that such information is not available in 
 the current code implementation.
 
+Usage: count_DOU_articles.py [--json] [START_DATE END_DATE]
+
+All steps are counted at once and each one is printed as soon as it 
+finishes (along with the time it took), even if others fail. With 
+--json, each step is printed as a JSON object in its own line.
+
+If START_DATE and END_DATE (format YYYY-MM-DD) are given, count the 
+articles of every date in that range (inclusive) in the website, 
+S3, Google Storage and BigQuery, instead of today's.
+
 Written by: Henrique S. Xavier, hsxavier@gmail.com, on 18/may/2020.
 """
 
 import sys
-import requests
-from lxml import html
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+import threading
+import time
 import datetime as dt
-import boto3
+import json
+from collections import Counter
 #import os
 #import google.auth
-from google.cloud import bigquery
-from google.cloud import storage
 import pandas as pd
 import numpy as np
 
 import auxiliar as aux
+import dou_website as web
+import stage_stats as ss
 
 debug = False
 
+# Capture pipeline steps backed by DynamoDB tables (step name, table name). The 
+# tables hold every article ever captured, not only a day's, so these steps' counts
+# can only be followed by their growth, not compared to the website's:
+dynamo_steps = [('Gabi (bot no Slack)', 'dou_captured_urls'), ('Sistema de captura', 'douDB_captured_urls')]
+growth_steps = [name for name, table in dynamo_steps]
+
+# Capture pipeline steps backed by BigQuery tables (step name, table name):
+bigquery_steps = [('Ranqueados pela IA', 'artigos_ranqueados_auto')]
+#bigquery_steps = [('BQ (semana)', 'artigos_cleaned_da_semana'), ('Ranqueados pela IA', 'artigos_ranqueados_auto')]
+
 ### Funções ###
         
-def get_artigos_do(data, secao):
+def leiturajornal_url(data, secao):
     """
-    Para uma data (datetime) e uma seção (str) do DOU,
-    retorna uma lista de jsons com todos os links e outros metadados dos 
-    artigos daquele dia e seção. 
+    Return the URL (str) of the page in the imprensa oficial 
+    website that lists the articles of a date `data` (datetime) 
+    and DOU section `secao` (str).
     """
     # Hard-coded:
     do_date_format = '%d-%m-%Y'
@@ -48,19 +70,51 @@ def get_artigos_do(data, secao):
     
     # Exemplo de URL: 'http://www.in.gov.br/leiturajornal?data=13-05-2019&secao=do1'
     url   = 'http://www.in.gov.br/leiturajornal?data=' + data_string + '&secao=do' + str(secao)
+    
+    return url
+
+
+def get_leiturajornal_params(data, secao):
+    """
+    Para uma data (datetime) e uma seção (str) do DOU,
+    retorna o JSON (str) com os metadados dos artigos 
+    daquele dia e seção, embutido na página do DOU.
+    """
+    
+    # Captura a página daquele dia e seção (com conexões e cache compartilhados):
+    content = web.fetch_page(leiturajornal_url(data, secao))
+    
+    return web.find_params(content)
 
-    # Specifies number of retries for GET:
-    session = requests.Session()
-    session.mount('http://www.in.gov.br', requests.adapters.HTTPAdapter(max_retries=3))
+
+def get_artigos_do(data, secao):
+    """
+    Para uma data (datetime) e uma seção (str) do DOU,
+    retorna uma lista de jsons com todos os links e outros metadados dos 
+    artigos daquele dia e seção. 
+    """
     
-    # Captura a lista de artigos daquele dia e seção:
-    try:
-        res = session.get(url)
-    except requests.exceptions.SSLError:
-        res = session.get(url, verify=False)
-    tree  = html.fromstring(res.content)
-    xpath = '//*[@id="params"]/text()'
-    return json.loads(tree.xpath(xpath)[0])['jsonArray']
+    return web.decode_json_array(get_leiturajornal_params(data, secao))
+
+
+def count_artigos_do(data, secao):
+    """
+    Para uma data (datetime) e uma seção (str) do DOU,
+    retorna o número de artigos daquele dia e seção, 
+    sem montar os jsons dos artigos.
+    """
+    
+    return web.count_json_array(get_leiturajornal_params(data, secao))
+
+
+def get_artigos_do_fields(data, secao, fields=('urlTitle',)):
+    """
+    Para uma data (datetime) e uma seção (str) do DOU,
+    retorna uma lista de tuplas com os valores dos campos 
+    `fields` (lista de str) de cada artigo daquele dia e seção.
+    """
+    
+    return web.extract_json_array(get_leiturajornal_params(data, secao), fields)
 
 
 def brasilia_day(yesterday=False):
@@ -78,60 +132,164 @@ def brasilia_day(yesterday=False):
         return (dt.datetime.utcnow() + dt.timedelta(hours=-3)).replace(hour=0, minute=0, second=0, microsecond=0)
     
 
+def brasilia_now():
+    """
+    No matter where the code is ran, return the current 
+    UTC-3 time (Brasilia local time, no daylight savings).
+    """
+    
+    return dt.datetime.utcnow() + dt.timedelta(hours=-3)
+
+
+def date_range(start_date, end_date):
+    """
+    Return a list of all days (datetime) from `start_date` 
+    to `end_date` (datetimes), inclusive.
+    """
+    
+    n_days = (end_date - start_date).days + 1
+    
+    return [start_date + dt.timedelta(days=i) for i in range(n_days)]
+
+
 def list_dynamo_items(table_name):
     """
     Return a list of all items in a AWS dynamoDB table
     `table_name`.
     """
     
-    credentials = aux.load_aws_credentials()
-    dynamodb = boto3.resource('dynamodb', 
-                        aws_access_key_id=credentials['aws_access_key_id'], 
-                        aws_secret_access_key=credentials['aws_secret_access_key'],
-                        region_name='us-east-1')
+    dynamodb = aux.get_aws_resource('dynamodb', region_name='us-east-1')
 
     table = dynamodb.Table(table_name)
 
     # Get all items (following pagination if necessary):
     response = table.scan()
+    ss.record_aws_response(response)
     data = response['Items']
     while 'LastEvaluatedKey' in response:
         response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        ss.record_aws_response(response)
         data.extend(response['Items'])
 
     return data
 
 
+def count_dynamo_items(table_name, n_segments=4):
+    """
+    Count the items in the AWS dynamoDB table `table_name` 
+    without downloading them, by running a parallel scan 
+    with `n_segments` (int) segments, each in its own thread, 
+    that only asks for the item count (Select='COUNT').
+    
+    Returns
+    -------
+    scan_stats : dict
+        The number of items in the table ('count'), the 
+        number of scan pages read ('pages') and the read 
+        capacity units consumed by the scan ('capacity').
+    """
+    
+    # Low-level clients, unlike resources, can be shared among threads:
+    dynamodb = aux.get_aws_client('dynamodb', region_name='us-east-1')
+    
+    def scan_segment(segment):
+        scan_args = {'TableName': table_name, 'Select': 'COUNT', 'ReturnConsumedCapacity': 'TOTAL',
+                     'Segment': segment, 'TotalSegments': n_segments}
+        stats = {'count': 0, 'pages': 0, 'capacity': 0.0}
+        # Follow pagination, keeping only the counts:
+        while True:
+            response = dynamodb.scan(**scan_args)
+            ss.record_aws_response(response)
+            stats['count']    += response['Count']
+            stats['pages']    += 1
+            stats['capacity'] += response.get('ConsumedCapacity', {}).get('CapacityUnits', 0.0)
+            if 'LastEvaluatedKey' not in response:
+                return stats
+            scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    with ThreadPoolExecutor(max_workers=n_segments) as executor:
+        futures = [ss.submit(executor, scan_segment, segment) for segment in range(n_segments)]
+        segment_stats = [f.result() for f in futures]
+    
+    scan_stats = {key: sum(stats[key] for stats in segment_stats) for key in ['count', 'pages', 'capacity']}
+    
+    return scan_stats
+
+
 def list_s3_files(bucket, prefix):
     """
     Returns a list of files in AWS in a given `bucket` and with a given `prefix`.
     """
         
-    # Instantiate client:
-    credentials = aux.load_aws_credentials()
-    s3 = boto3.client('s3', 
-                        aws_access_key_id=credentials['aws_access_key_id'], 
-                        aws_secret_access_key=credentials['aws_secret_access_key'])
-
+    # Get shared client:
+    s3 = aux.get_aws_client('s3')
+    paginator = s3.get_paginator('list_objects_v2')
 
     if type(prefix) != list:
         prefix = [prefix]
     
-    # Loop over prefixes:
+    # Loop over prefixes, following the continuation tokens:
     file_list = []
     for p in prefix:
-        
-        # Load one prefix:
-        response  = s3.list_objects_v2(Bucket=bucket, Prefix=p)
-        if response['KeyCount'] > 0:
-            file_list = file_list + [d['Key'] for d in response['Contents']]
-            while response['IsTruncated']:
-                response  = s3.list_objects_v2(Bucket=bucket, Prefix=p, StartAfter=file_list[-1])
-                file_list = file_list + [d['Key'] for d in response['Contents']]    
+        for page in paginator.paginate(Bucket=bucket, Prefix=p):
+            ss.record_aws_response(page)
+            file_list.extend(d['Key'] for d in page.get('Contents', []))
     
     return file_list
 
 
+def section_from_key(key):
+    """
+    Return the DOU section (str) of a file stored in a 
+    `key` (str) that contains the partition 'part_secao=',
+    e.g. '.../part_data_pub=2021-09-15/part_secao=e/abc.json'
+    -> 'e'. Return None if the partition is not present.
+    """
+    
+    start = key.find('part_secao=')
+    if start == -1:
+        return None
+    start = start + len('part_secao=')
+    end   = key.find('/', start)
+    
+    return key[start:] if end == -1 else key[start:end]
+
+
+def count_s3_files_by_section(bucket, prefix, delimiter=None):
+    """
+    List the files in AWS S3 `bucket` (str) under `prefix` (str)
+    a single time and count them by DOU section (from their 
+    'part_secao=' partition), as they are listed, without 
+    storing the keys.
+    
+    If `delimiter` (str, e.g. '/') is given, count the common 
+    prefixes right below `prefix` (i.e. its 'folders') instead 
+    of the files. This is enough, for instance, to know which 
+    sections already exist, with a single page request.
+    
+    Returns a Counter from section (str) to number of files 
+    (or folders).
+    """
+    
+    # Get shared client:
+    s3 = aux.get_aws_client('s3')
+    paginator = s3.get_paginator('list_objects_v2')
+    
+    list_args = {'Bucket': bucket, 'Prefix': prefix}
+    if delimiter != None:
+        list_args['Delimiter'] = delimiter
+        
+    section_counts = Counter()
+    for page in paginator.paginate(**list_args):
+        ss.record_aws_response(page)
+        if delimiter == None:
+            section_counts.update(section_from_key(d['Key']) for d in page.get('Contents', []))
+        else:
+            section_counts.update(section_from_key(d['Prefix']) for d in page.get('CommonPrefixes', []))
+    
+    return section_counts
+
+
 def list_blobs_with_prefix(bucket_name, prefix, delimiter=None):
     """
     Lists all the blobs in the bucket that begin with the prefix.
@@ -159,40 +317,110 @@ def list_blobs_with_prefix(bucket_name, prefix, delimiter=None):
         a/b/
     """
 
-    credentials = aux.load_gcp_credentials()
-    project = 'gabinete-compartilhado'
-    storage_client = storage.Client(project=project, credentials=credentials)
+    storage_client = aux.get_storage_client()
 
     # Note: Client.list_blobs requires at least package version 1.17.0.
     blobs = storage_client.list_blobs(
         bucket_name, prefix=prefix, delimiter=delimiter
     )
 
-    blob_list = [blob.name for blob in blobs]
+    blob_list = []
+    for page in blobs.pages:
+        ss.record()
+        blob_list.extend(blob.name for blob in page)
     
     return blob_list
+
+
+def count_blobs_with_prefix(bucket_name, prefix, storage_client):
+    """
+    Count the blobs in Google Storage bucket `bucket_name` (str)
+    whose names start with `prefix` (str), using `storage_client`
+    (google.cloud.storage.Client). 
+    
+    Only the blob names are requested from the API and the 
+    blobs are counted per page of results, without building
+    `Blob` objects.
+    """
+    
+    blobs = storage_client.list_blobs(bucket_name, prefix=prefix, fields='items(name),nextPageToken')
+    n_blobs = 0
+    for page in blobs.pages:
+        ss.record()
+        n_blobs += page.num_items
+    
+    return n_blobs
+
+
+def count_blobs_by_section(bucket_name, prefix, storage_client):
+    """
+    List the blobs in Google Storage bucket `bucket_name` (str)
+    under `prefix` (str) a single time and count them by DOU 
+    section (from their 'part_secao=' partition), using 
+    `storage_client` (google.cloud.storage.Client). Only the 
+    blob names are requested from the API.
+    
+    Returns a Counter from section (str) to number of blobs.
+    """
+    
+    blobs = storage_client.list_blobs(bucket_name, prefix=prefix, fields='items(name),nextPageToken')
+    section_counts = Counter()
+    for page in blobs.pages:
+        ss.record()
+        section_counts.update(section_from_key(blob.name) for blob in page)
+    
+    return section_counts
+
+
+def map_sections(counter, all_sections, parallel=False):
+    """
+    Apply `counter` (callable that takes a DOU section and returns 
+    an int) to every section in `all_sections` and return a dict 
+    from section to count. If `parallel` is True, all sections are 
+    counted at once, each one in its own thread.
+    """
+    
+    if parallel:
+        with ThreadPoolExecutor(max_workers=len(all_sections)) as executor:
+            futures = [ss.submit(executor, counter, s) for s in all_sections]
+            counts  = [f.result() for f in futures]
+    else:
+        counts = [counter(s) for s in all_sections]
+    
+    return dict(zip(all_sections, counts))
         
 
 def count_dynamo(table_name, all_sections):
+    """
+    Given an AWS dynamoDB table name `table_name` and a list of
+    DOU sections `all_sections`, returns a dict with the table 
+    name as source and the total number of items in the table
+    (the counts per section are not available). The number of 
+    scan pages and consumed capacity are also returned, under 
+    'scan_pages' and 'scan_capacity'.
+    """
     n_items = {'source': table_name}
     for s in all_sections:
         n_items[s] = -1
-    n_items['total'] = len(list_dynamo_items(table_name))
+    scan_stats = count_dynamo_items(table_name)
+    n_items['total'] = scan_stats['count']
+    n_items['scan_pages']    = scan_stats['pages']
+    n_items['scan_capacity'] = scan_stats['capacity']
+    if debug:
+        print('{}: {} scan pages, {:.1f} capacity units'.format(table_name, scan_stats['pages'], scan_stats['capacity']))
     
     return n_items
     
-def count_website(current_date, all_sections):
+def count_website(current_date, all_sections, parallel=False):
     """
     Given a date (datetime) `current_date` and a list of DOU 
     sections `all_sections` (e.g. [1, 2, 3, 'e']), returns 
     a dict with a hard-coded 'source' name and the number of 
-    articles in DOU website for each section.
+    articles in DOU website for each section. If `parallel` 
+    is True, the sections are downloaded concurrently.
     """
-    website_n_articles = {}
-    total = 0
-    for s in all_sections:
-        website_n_articles[s] = len(get_artigos_do(current_date, s))
-        total = total + website_n_articles[s]
+    website_n_articles = map_sections(lambda s: count_artigos_do(current_date, s), all_sections, parallel)
+    total = sum(website_n_articles.values())
     website_n_articles['source'] = 'Site'
     website_n_articles['total']  = total
     return website_n_articles
@@ -203,41 +431,48 @@ def count_s3(current_date, all_sections):
     Given a date (datetime) `current_date` and a DOU section list 
     `all_sections`, returns a dict with the source name 'S3' 
     and the number of articles saved in S3 belonging to the date 
-    and sections.
+    and sections. The date's files are listed only once, for all 
+    sections.
     """
     bucket = 'brutos-publicos'
     prefix = 'executivo/federal/dou-partitioned/'
     
+    key = prefix + 'part_data_pub=' + current_date.strftime('%Y-%m-%d') + '/'
+    section_counts = count_s3_files_by_section(bucket, key)
+    
     s3_counts = {'source': 'S3'} 
-    total = 0
     for s in all_sections:
-        key = prefix + 'part_data_pub=' + current_date.strftime('%Y-%m-%d') + '/part_secao=' + str(s)
-        s3_counts[s] = len(list_s3_files(bucket, key))
-        total = total + s3_counts[s]
-    
-    s3_counts['total'] = total
+        s3_counts[s] = section_counts[str(s)]
+    s3_counts['total'] = sum(s3_counts[s] for s in all_sections)
     
     return s3_counts
 
 
-def count_storage(current_date, all_sections):
+def count_storage(current_date, all_sections, parallel=False):
     """
     Given a date (datetime) `current_date` and a DOU section list 
     `all_sections`, returns a dict with the source name 'GCP storage' 
     and the number of articles saved in Storage belonging to the date 
-    and sections.
+    and sections. If `parallel` is True, each section's prefix is 
+    counted concurrently; otherwise, the date's blobs are listed 
+    only once, for all sections.
     """
     bucket = 'brutos-publicos'
     prefix = 'executivo/federal/dou-partitioned/'
+    key    = prefix + 'part_data_pub=' + current_date.strftime('%Y-%m-%d') + '/'
+    
+    storage_client = aux.get_storage_client()
+    
+    if parallel:
+        section_counts = map_sections(lambda s: count_blobs_with_prefix(bucket, key + 'part_secao=' + s, storage_client), 
+                                      [str(s) for s in all_sections], parallel)
+    else:
+        section_counts = count_blobs_by_section(bucket, key, storage_client)
     
     s3_counts = {'source': 'GCP storage'} 
-    total = 0
     for s in all_sections:
-        key = prefix + 'part_data_pub=' + current_date.strftime('%Y-%m-%d') + '/part_secao=' + str(s)
-        s3_counts[s] = len(list_blobs_with_prefix(bucket, key))
-        total = total + s3_counts[s]
-    
-    s3_counts['total'] = total
+        s3_counts[s] = section_counts[str(s)]
+    s3_counts['total'] = sum(s3_counts[s] for s in all_sections)
     
     return s3_counts
 
@@ -247,10 +482,8 @@ def query_bigquery(query):
     Run a `query` in Google BigQuery and return the results as a list of dicts.
     """
     
-    # Instantiate client w/ credentials:    
-    credentials = aux.load_gcp_credentials()
-    project = 'gabinete-compartilhado'
-    bq = bigquery.Client(credentials=credentials, project=project)
+    # Get shared client w/ credentials:    
+    bq = aux.get_bigquery_client()
     
     result = bq.query(
         query,
@@ -259,42 +492,111 @@ def query_bigquery(query):
     )  # API request - starts the query
     
     result = [dict(r.items()) for r in result] 
+    ss.record()
     
     return result
 
 
-def count_semana(current_date, all_sections):
+def count_bigquery_dates(start_date, end_date, all_sections, source_tables):
     """
-    Check the number of DOU articles in a BigQuery table
-    (hard-coded to 'artigos_cleaned_da_semana') and return 
-    them in a dict, along with the source name
-    (hard-coded to 'BQ (semana)').
+    Count the DOU articles published from `start_date` to 
+    `end_date` (datetimes, inclusive) in many BigQuery tables, 
+    for every date, with a single query.
+    
+    Input
+    -----
+    start_date : datetime
+        The first publication date of the articles to count.
+    end_date : datetime
+        The last publication date of the articles to count.
+    all_sections : list
+        The DOU sections to count, e.g. ['1', '2', '3', 'e'].
+    source_tables : list of tuples
+        Pairs (source name, table name) of the tables in the 
+        'executivo_federal_dou' dataset to count, e.g. 
+        [('BQ (auto)', 'artigos_ranqueados_auto')].
+    
+    Return
+    ------
+    counts : dict
+        For each date (str, '%Y-%m-%d'), a list with the article 
+        counts per section (dicts) of each table, along with its 
+        source name, in the same order as `source_tables`.
     """
     
-    # Query bigQuery table:
+    # Build a single query over all tables, tagging the rows by table:
     query_template = """
-    SELECT secao, tipo_edicao, count(*) AS counts
-    FROM `gabinete-compartilhado.executivo_federal_dou.artigos_cleaned_da_semana`
-    WHERE data_pub = '%(date)s'
-    GROUP by secao, tipo_edicao
-    order by tipo_edicao DESC, secao
+    SELECT '%(table)s' AS tabela, CAST(data_pub AS STRING) AS data_pub, secao, tipo_edicao, count(*) AS counts
+    FROM `gabinete-compartilhado.executivo_federal_dou.%(table)s`
+    WHERE data_pub BETWEEN '%(start)s' AND '%(end)s'
+    GROUP by data_pub, secao, tipo_edicao
     """
-    query   = query_template % {'date': current_date.strftime('%Y-%m-%d')}
-    results = query_bigquery(query)
-
+    start_str = start_date.strftime('%Y-%m-%d')
+    end_str   = end_date.strftime('%Y-%m-%d')
+    query     = 'UNION ALL'.join([query_template % {'table': table, 'start': start_str, 'end': end_str} 
+                                  for source, table in source_tables])
+    results   = query_bigquery(query)
+
+    # Index results by date, table and section ('e' for all extra editions):
+    results_counts = Counter()
+    for r in results:
+        if r['tipo_edicao'] == 'Extra':
+            results_counts[(r['data_pub'], r['tabela'], 'e')] += r['counts']
+        elif r['tipo_edicao'] == 'Ordinária':
+            results_counts[(r['data_pub'], r['tabela'], str(r['secao']))] += r['counts']
+    
     # Parse results:
-    counts_bq = {'source': 'BQ (semana)'}
-    total = 0
-    for s in all_sections:
-        if s == 'e':
-            counts_bq['e'] = sum([r['counts'] for r in results if r['tipo_edicao'] == 'Extra'])
-        else:
-            counts_bq[s] = sum([r['counts'] for r in results if r['tipo_edicao'] == 'Ordinária' and r['secao'] == int(s)])
-        total = total + counts_bq[s]
+    counts = {}
+    for date in date_range(start_date, end_date):
+        date_str = date.strftime('%Y-%m-%d')
+        counts[date_str] = []
+        for source, table in source_tables:
+            counts_bq = {'source': source}
+            for s in all_sections:
+                counts_bq[s] = results_counts[(date_str, table, str(s))]
+            counts_bq['total'] = sum(counts_bq[s] for s in all_sections)
+            counts[date_str].append(counts_bq)
+    
+    return counts
+
+
+def count_bigquery(current_date, all_sections, source_tables):
+    """
+    Count the DOU articles published on `current_date` (datetime) 
+    in many BigQuery tables with a single query.
+    
+    Input
+    -----
+    current_date : datetime
+        The publication date of the articles to count.
+    all_sections : list
+        The DOU sections to count, e.g. ['1', '2', '3', 'e'].
+    source_tables : list of tuples
+        Pairs (source name, table name) of the tables in the 
+        'executivo_federal_dou' dataset to count, e.g. 
+        [('BQ (auto)', 'artigos_ranqueados_auto')].
+    
+    Return
+    ------
+    counts : list of dicts
+        The article counts per section of each table, along 
+        with its source name, in the same order as `source_tables`.
+    """
+    
+    counts = count_bigquery_dates(current_date, current_date, all_sections, source_tables)
+    
+    return counts[current_date.strftime('%Y-%m-%d')]
 
-    counts_bq['total'] = total
+
+def count_semana(current_date, all_sections):
+    """
+    Check the number of DOU articles in a BigQuery table
+    (hard-coded to 'artigos_cleaned_da_semana') and return 
+    them in a dict, along with the source name
+    (hard-coded to 'BQ (semana)').
+    """
     
-    return counts_bq
+    return count_bigquery(current_date, all_sections, [('BQ (semana)', 'artigos_cleaned_da_semana')])[0]
 
 
 def count_rank_auto(current_date, all_sections):
@@ -305,30 +607,33 @@ def count_rank_auto(current_date, all_sections):
     (hard-coded to 'BQ (auto)').
     """
     
-    # Query bigQuery table:
-    query_template = """
-    SELECT secao, tipo_edicao, count(*) AS counts
-    FROM `gabinete-compartilhado.executivo_federal_dou.artigos_ranqueados_auto`
-    WHERE data_pub = '%(date)s'
-    GROUP by secao, tipo_edicao
-    order by tipo_edicao DESC, secao
-    """
-    query   = query_template % {'date': current_date.strftime('%Y-%m-%d')}
-    results = query_bigquery(query)
+    return count_bigquery(current_date, all_sections, [('BQ (auto)', 'artigos_ranqueados_auto')])[0]
 
-    # Parse results:
-    counts_bq = {'source': 'BQ (auto)'}
-    total = 0
-    for s in all_sections:
-        if s == 'e':
-            counts_bq['e'] = sum([r['counts'] for r in results if r['tipo_edicao'] == 'Extra'])
-        else:
-            counts_bq[s] = sum([r['counts'] for r in results if r['tipo_edicao'] == 'Ordinária' and r['secao'] == int(s)])
-        total = total + counts_bq[s]
 
-    counts_bq['total'] = total
+def share_call(func, *args):
+    """
+    Return a function that, the first time it is called, 
+    calls `func(*args)` and, on the next calls (even 
+    concurrent ones, from other threads), returns the 
+    same result or raises the same exception, without 
+    calling `func` again.
+    """
+    
+    lock   = threading.Lock()
+    result = {}
+    
+    def shared_func():
+        with lock:
+            if len(result) == 0:
+                try:
+                    result['value'] = func(*args)
+                except Exception as e:
+                    result['error'] = e
+        if 'error' in result:
+            raise result['error']
+        return result['value']
     
-    return counts_bq
+    return shared_func
 
 
 def get_total3(counts, all_sections):
@@ -362,7 +667,28 @@ def print_counts(source_counts, all_sections):
     for s in all_sections:
         print('  {:4d}'.format(source_counts[s]), end='')
     print('  {:5d}'.format(source_counts['total']), end='')
-    print('  {:5d}'.format(source_counts['tot-3']))
+    print('  {:5d}'.format(source_counts['tot-3']), end='')
+    # Step instrumentation, if available:
+    if 'stats' in source_counts:
+        print('  ' + ss.format_stats(source_counts['stats']), end='')
+    print('', flush=True)
+
+
+def stage_record(step_name, counts, exception, step_stats, current_date, all_sections):
+    """
+    Return a dict, serializable to JSON, describing the result 
+    of the capture pipeline step `step_name` (str) for the DOU 
+    publication date `current_date` (datetime): its `counts` 
+    (dict, or None if the step failed), the `exception` it 
+    raised (or None) and its statistics `step_stats` (dict).
+    """
+    
+    record = {'data_pub': current_date.strftime('%Y-%m-%d'), 'stage': step_name, 'counts': None, 
+              'error': None if exception == None else str(exception), 'stats': step_stats}
+    if counts != None:
+        record['counts'] = {str(s): int(counts[s]) for s in list(all_sections) + ['total', 'tot-3']}
+    
+    return record
 
 
 def failed_capture_actions(step_name, error_msgs, counts, exception):
@@ -395,11 +721,125 @@ def failed_capture_actions(step_name, error_msgs, counts, exception):
     counts.append(failed_entry)
 
 
-def count_through_pipeline():
+def capture_stages(current_date, all_sections, parallel=False):
+    """
+    Return the steps of the capture pipeline, in the order they 
+    are displayed, as a list of (step name, counter, args) tuples.
+    Calling `counter(*args)` returns the counts dict of that step.
+    If `parallel` is True, the steps that go through DOU sections 
+    one by one count all of them concurrently.
+    """
+    
+    stages = [('Site', count_website, (current_date, all_sections, parallel))]
+    stages += [(name, count_dynamo, (table, all_sections)) for name, table in dynamo_steps]
+    stages += [('Cloud da Amazon',     count_s3,        (current_date, all_sections)),
+               ('Cloud do Google',     count_storage,   (current_date, all_sections, parallel))]
+    
+    # All BigQuery steps share the same query job:
+    bigquery_job = share_call(count_bigquery, current_date, all_sections, bigquery_steps)
+    for i, (name, table) in enumerate(bigquery_steps):
+        stages.append((name, lambda i: bigquery_job()[i], (i,)))
+    
+    return stages
+
+
+def count_stage(step_name, counter, args, all_sections, durations=None, stats=None):
+    """
+    Run the `counter` (callable) of a capture pipeline step 
+    over `args` (tuple) and return its counts dict, with the 
+    'tot-3' entry and with the source set to `step_name` (str).
+    
+    The step is instrumented: its wall time, number of API 
+    calls (or result pages), bytes received and retries are 
+    returned in the counts dict under 'stats' (see 
+    `stage_stats.py`). If `durations` (dict) is provided, the 
+    time taken by the step (in seconds), successful or not, 
+    is stored in it under `step_name`; if `stats` (dict) is 
+    provided, so are the step's statistics.
+    """
+    
+    step_stats = ss.new_stats()
+    token = ss.current_stats.set(step_stats)
+    start = time.time()
+    try:
+        counts = counter(*args)
+    finally:
+        step_stats['time'] = time.time() - start
+        ss.current_stats.reset(token)
+        if durations != None:
+            durations[step_name] = step_stats['time']
+        if stats != None:
+            stats[step_name] = step_stats
+    get_total3(counts, all_sections)
+    counts.update({'source': step_name, 'stats': step_stats})
+    
+    return counts
+
+
+def counts_to_dataframe(counts):
+    """
+    Build the DataFrame displayed in the app out of `counts`
+    (list of dicts), the article counts at each step of the 
+    capture pipeline.
+    """
+    
+    df = pd.DataFrame(counts)
+    new_cols = ['Estágio', '1', '2', '3', 'Extra', 'Total', 'Total s/ 3']
+    old_cols = ['source', '1', '2', '3', 'e', 'total', 'tot-3']
+    renamer  = dict(zip(old_cols, new_cols))
+    df.rename(renamer, axis=1, inplace=True)
+    df = df[new_cols]
+    df.set_index('Estágio', inplace=True)
+    
+    return df
+
+
+def iter_stage_counts(current_date, all_sections, parallel=True):
+    """
+    Count all steps of the capture pipeline for `current_date`
+    (datetime) and sections `all_sections` at once, each one in 
+    its own thread, and yield each step as soon as it finishes,
+    as a tuple (step name, counts dict or None, Exception or None,
+    step statistics dict). Failed steps do not stop the others. 
+    If `parallel` is True, the sections inside each step are 
+    also counted concurrently.
+    """
+    
+    stages = capture_stages(current_date, all_sections, parallel)
+    stats  = {}
+    
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        futures = {executor.submit(count_stage, name, counter, args, all_sections, None, stats): name 
+                   for name, counter, args in stages}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                yield name, future.result(), None, stats[name]
+            except Exception as e:
+                yield name, None, e, stats[name]
+
+
+def count_through_pipeline(concurrent=True, durations=None, stats=None):
     """
     Build a DataFrame with article counts at each step of the 
     capturing pipeline.
     
+    Input
+    -----
+    concurrent : bool
+        If True, all the steps (and all sections inside each step)
+        are counted at once, in a pool of threads, so the total 
+        time is close to the one taken by the slowest step. If 
+        False, the steps are counted one after another.
+    durations : dict or None
+        If a dict, it is filled with the time (in seconds) 
+        taken by each step, keyed by step name.
+    stats : dict or None
+        If a dict, it is filled with the instrumentation of 
+        each step (wall time 'time', API calls or pages 'calls', 
+        bytes received 'bytes' and 'retries', None if not 
+        measured), keyed by step name, including failed steps.
+    
     Return
     ------
     df : DataFrame
@@ -415,68 +855,92 @@ def count_through_pipeline():
     
     counts = []
     error_msgs = []
+    stages = capture_stages(current_date, all_sections, parallel=concurrent)
 
-    # Count on website:
-    try:
-        site_counts = count_website(current_date, all_sections)
-        get_total3(site_counts, all_sections)
-        counts.append(site_counts)
-    except Exception as e:
-        failed_capture_actions('Site', error_msgs, counts, e)
-
-    # DynamoDB Slack-bot-warning counts:
-    try:
-        slack_counts = count_dynamo('dou_captured_urls', all_sections)
-        get_total3(slack_counts, all_sections)
-        slack_counts.update({'source': 'Gabi (bot no Slack)'})
-        counts.append(slack_counts)
-    except Exception as e:
-        failed_capture_actions('Gabi (bot no Slack)', error_msgs, counts, e)
-
-    # DynamoDB capture-to-Database counts:
-    try:
-        dyn_counts = count_dynamo('douDB_captured_urls', all_sections)
-        get_total3(dyn_counts, all_sections)
-        dyn_counts.update({'source': 'Sistema de captura'})
-        counts.append(dyn_counts)
-    except Exception as e:
-        failed_capture_actions('Sistema de captura', error_msgs, counts, e)
-    
-    # S3 counts:
-    try:
-        saved_counts = count_s3(current_date, all_sections)
-        get_total3(saved_counts, all_sections)
-        saved_counts.update({'source': 'Cloud da Amazon'})
-        counts.append(saved_counts)
-    except Exception as e:
-        failed_capture_actions('Cloud da Amazon', error_msgs, counts, e)
-
-    # Storage counts:
-    try:
-        storage_counts = count_storage(current_date, all_sections)
-        get_total3(storage_counts, all_sections)
-        storage_counts.update({'source': 'Cloud do Google'})
-        counts.append(storage_counts)
-    except Exception as e:
-        failed_capture_actions('Cloud do Google', error_msgs, counts, e)
-    
-    # BigQuery (ranqueados auto table) counts:
-    try:
-        auto_counts = count_rank_auto(current_date, all_sections)
-        get_total3(auto_counts, all_sections)
-        auto_counts.update({'source': 'Ranqueados pela IA'})
-        counts.append(auto_counts)
-    except Exception as e:
-        failed_capture_actions('Ranqueados pela IA', error_msgs, counts, e)    
+    # Dispatch all steps at once or prepare them to run in sequence:
+    if concurrent:
+        executor = ThreadPoolExecutor(max_workers=len(stages))
+        jobs = [executor.submit(count_stage, name, counter, args, all_sections, durations, stats).result for name, counter, args in stages]
+    else:
+        jobs = [partial(count_stage, name, counter, args, all_sections, durations, stats) for name, counter, args in stages]
+
+    # Gather the counts in the pipeline order:
+    for (name, counter, args), job in zip(stages, jobs):
+        try:
+            counts.append(job())
+        except Exception as e:
+            failed_capture_actions(name, error_msgs, counts, e)
+    
+    if concurrent:
+        executor.shutdown()
 
     # Cria dataframe:
-    df = pd.DataFrame(counts)
-    new_cols = ['Estágio', '1', '2', '3', 'Extra', 'Total', 'Total s/ 3']
-    old_cols = ['source', '1', '2', '3', 'e', 'total', 'tot-3']
-    renamer  = dict(zip(old_cols, new_cols))
-    df.rename(renamer, axis=1, inplace=True)
-    df = df[new_cols]
-    df.set_index('Estágio', inplace=True)
+    df = counts_to_dataframe(counts)
+    
+    return df, error_msgs
+
+
+def count_date_range(start_date, end_date, max_workers=16):
+    """
+    Build a DataFrame with article counts at each step of the 
+    capturing pipeline for every DOU publication date from 
+    `start_date` to `end_date` (datetimes, inclusive).
+    
+    All BigQuery steps of all dates are counted with a single 
+    query, and the website, S3 and Storage counts of each date
+    (each one a single listing of the date's files) are spread
+    across a pool of `max_workers` (int) threads. The DynamoDB 
+    steps are not included since their counts are not split 
+    by date. Raises ValueError if `end_date` is before 
+    `start_date`.
+    
+    Return
+    ------
+    df : DataFrame
+        The counts for each section (columns), indexed by date 
+        and pipeline step.
+    error_msgs : list of str
+        The error messages that may have been generated at any 
+        date and step. If no errors, the list is empty.
+    """
+    
+    if end_date < start_date:
+        raise ValueError('The end date ({}) is before the start date ({}).'.format(end_date.strftime('%Y-%m-%d'), 
+                                                                                  start_date.strftime('%Y-%m-%d')))
+    
+    # Hard-coded & settings:
+    all_sections = ['1', '2', '3', 'e']
+    dates = date_range(start_date, end_date)
+    
+    # List (date, step name, counter) for all dates and steps:
+    jobs = []
+    for date in dates:
+        jobs.append((date, 'Site',            partial(count_website, date, all_sections)))
+        jobs.append((date, 'Cloud da Amazon', partial(count_s3, date, all_sections)))
+        jobs.append((date, 'Cloud do Google', partial(count_storage, date, all_sections)))
+    bigquery_job = share_call(count_bigquery_dates, start_date, end_date, all_sections, bigquery_steps)
+    for date in dates:
+        for i, (name, table) in enumerate(bigquery_steps):
+            jobs.append((date, name, partial(lambda d, i: bigquery_job()[d.strftime('%Y-%m-%d')][i], date, i)))
+    
+    # Count all of them:
+    counts = []
+    error_msgs = []
+    row_dates = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(count_stage, name, counter, (), all_sections) for date, name, counter in jobs]
+        for (date, name, counter), future in zip(jobs, futures):
+            try:
+                counts.append(future.result())
+            except Exception as e:
+                failed_capture_actions(name, error_msgs, counts, e)
+                error_msgs[-1] = date.strftime('%Y-%m-%d') + ': ' + error_msgs[-1]
+            row_dates.append(date.strftime('%Y-%m-%d'))
+    
+    # Cria dataframe (data x estágio x seção):
+    df = counts_to_dataframe(counts)
+    df.index = pd.MultiIndex.from_arrays([row_dates, df.index], names=['Data', 'Estágio'])
+    df.sort_index(level='Data', sort_remaining=False, inplace=True)
     
     return df, error_msgs
 
@@ -517,55 +981,54 @@ def main(args=['script_filename']):
     the number of arguments the script accepts.
     """
     # Hard-coded:
-    n_args = 0
+    n_args = [0, 2]
+    
+    # Machine-readable output flag:
+    json_output = '--json' in args
+    args = [a for a in args if a != '--json']
     
     # Docstring output:
-    if len(args) != 1 + n_args: 
+    if len(args) - 1 not in n_args: 
         print(__doc__)
         sys.exit(1)
 
     # START OF SCRIPT:
 
+    # Date range mode:
+    if len(args) == 3:
+        start_date = dt.datetime.strptime(args[1], '%Y-%m-%d')
+        end_date   = dt.datetime.strptime(args[2], '%Y-%m-%d')
+        if end_date < start_date:
+            print('END_DATE ({}) is before START_DATE ({}).'.format(args[2], args[1]))
+            sys.exit(1)
+        df, error_msgs = count_date_range(start_date, end_date)
+        if json_output:
+            print(df.reset_index().to_json(orient='records', lines=True, force_ascii=False))
+            for msg in error_msgs:
+                print(json.dumps({'error': msg}, ensure_ascii=False))
+        else:
+            print(df.to_string())
+            for msg in error_msgs:
+                print(msg)
+        return
+
     current_date = brasilia_day()
     all_sections = ['1', '2', '3', 'e']
     
     # Header:
-    template = '\033[1m{:20s}  ' + ('  '.join(['{:^4s}'] * len(all_sections)) + '  {:^5s}  {:^5s}\033[0m')
-    print(template.format('Fonte', *all_sections, 'Total', 'Tot-3'))
-    
-    # Website counts:
-    if True:
-        site_counts = count_website(current_date, all_sections)
-        get_total3(site_counts, all_sections)
-        print_counts(site_counts, all_sections)
-    
-    # DynamoDB counts:
-    slack_counts = count_dynamo('dou_captured_urls', all_sections)
-    get_total3(slack_counts, all_sections)
-    print_counts(slack_counts, all_sections)
-    dyndb_counts = count_dynamo('douDB_captured_urls', all_sections)
-    get_total3(dyndb_counts, all_sections)
-    print_counts(dyndb_counts, all_sections)
-    
-    # S3 counts:
-    saved_counts = count_s3(current_date, all_sections)
-    get_total3(saved_counts, all_sections)
-    print_counts(saved_counts, all_sections)
-    
-    # Storage counts:
-    storage_counts = count_storage(current_date, all_sections)
-    get_total3(storage_counts, all_sections)
-    print_counts(storage_counts, all_sections)
-    
-    # BigQuery (semana table) counts:
-    #semana_counts = count_semana(current_date, all_sections)
-    #get_total3(semana_counts, all_sections)
-    #print_counts(semana_counts, all_sections)
-    
-    # BigQuery (ranqueados auto table) counts:
-    auto_counts = count_rank_auto(current_date, all_sections)
-    get_total3(auto_counts, all_sections)
-    print_counts(auto_counts, all_sections)
+    if not json_output:
+        template = '\033[1m{:20s}  ' + ('  '.join(['{:^4s}'] * len(all_sections)) + '  {:^5s}  {:^5s}  {}\033[0m')
+        print(template.format('Fonte', *all_sections, 'Total', 'Tot-3', 'Desempenho'), flush=True)
+    
+    # Print each step as soon as it is counted:
+    for name, counts, exception, step_stats in iter_stage_counts(current_date, all_sections):
+        if json_output:
+            record = stage_record(name, counts, exception, step_stats, current_date, all_sections)
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+        elif exception == None:
+            print_counts(counts, all_sections)
+        else:
+            print('{:20s}  Falhou após {:.1f} s: {}'.format(name, step_stats['time'], str(exception)), flush=True)
 
 
 # If running this code as a script:
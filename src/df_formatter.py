@@ -100,4 +100,8 @@ def style_below_step(v, props='', step=-10):
     To be used together with:
         df.applymap(style_below_step, props='background-color:pink;')
     """
+    # Security check for strings:
+    if type(v) == str:
+        return None
+    
     return props if v < step else None
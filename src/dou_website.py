@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Download pages from the 'imprensa oficial' website (www.in.gov.br) 
+through a shared pool of keep-alive connections (each thread has
+its own session, but all use the same connection pool). The pages
+most recently downloaded are revalidated with 'ETag'/'If-Modified-Since'
+headers, so an unchanged page costs a '304 Not Modified' response 
+instead of a full download.
+
+Also extract the list of articles embedded in the 'leiturajornal' 
+pages without parsing the whole HTML document.
+"""
+
+import sys
+import re
+import json
+import threading
+from collections import OrderedDict
+import requests
+
+import stage_stats as ss
+
+
+# Hard-coded:
+cache_size = 64
+
+
+### Funções ###
+
+def build_adapter(pool_size=8, max_retries=3):
+    """
+    Return a `requests.adapters.HTTPAdapter` that keeps up 
+    to `pool_size` (int) connection pools, each with up to 
+    `pool_size` connections kept alive, with `max_retries` 
+    (int) retries for each GET. Its connection pools are 
+    thread-safe, so it can be shared by many sessions.
+    """
+    
+    return requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries)
+
+
+def build_session(adapter):
+    """
+    Return a `requests.Session` that connects to the imprensa 
+    oficial website through `adapter` (HTTPAdapter) and asks 
+    for gzip-compressed responses.
+    """
+    
+    session = requests.Session()
+    session.mount('http://www.in.gov.br', adapter)
+    session.mount('https://www.in.gov.br', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+    
+    return session
+
+
+# Connections kept alive, shared by all threads (and all their sessions):
+adapter       = build_adapter()
+# Sessions are not thread-safe, so each thread gets its own:
+session_local = threading.local()
+# The last `cache_size` pages downloaded, shared by all threads (least recently used first):
+page_cache    = OrderedDict()
+cache_lock    = threading.Lock()
+
+
+def get_session():
+    """
+    Return the `requests.Session` of the current thread,
+    created on its first call. All sessions share the 
+    module's `adapter`, so the connections opened by 
+    earlier (possibly finished) threads are reused.
+    """
+    
+    if not hasattr(session_local, 'session'):
+        session_local.session = build_session(adapter)
+    
+    return session_local.session
+
+
+def get_page(url, headers={}):
+    """
+    GET the page at `url` (str) with `headers` (dict), 
+    retrying without certificate verification if it fails, 
+    and report the download to the running pipeline step.
+    Returns a `requests.Response`.
+    """
+    
+    session = get_session()
+    ssl_retries = 0
+    try:
+        res = session.get(url, headers=headers)
+    except requests.exceptions.SSLError:
+        ssl_retries = 1
+        res = session.get(url, headers=headers, verify=False)
+    
+    # Bytes as sent, possibly compressed:
+    retries = res.raw.retries
+    n_bytes = int(res.headers.get('Content-Length', len(res.content)))
+    ss.record(1, n_bytes, ssl_retries + (0 if retries == None else len(retries.history)))
+    
+    return res
+
+
+def fetch_page(url):
+    """
+    Download the page at `url` (str) and return its content 
+    (bytes). If the page was downloaded recently, ask the server
+    whether it changed and reuse the previous content if it did
+    not.
+    """
+    
+    # Get the validators of the previous download, if any:
+    with cache_lock:
+        cached = page_cache.get(url)
+        if cached != None:
+            page_cache.move_to_end(url)
+    headers = {}
+    if cached != None:
+        if cached['etag'] != None:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified'] != None:
+            headers['If-Modified-Since'] = cached['last_modified']
+    
+    # Download the page:
+    res = get_page(url, headers)
+    
+    # Page did not change:
+    if res.status_code == 304:
+        if cached != None:
+            return cached['content']
+        # Nothing to reuse, so download it in full:
+        res = get_page(url)
+        if res.status_code == 304:
+            raise requests.exceptions.HTTPError('Unexpected 304 response without validators for ' + url, response=res)
+    res.raise_for_status()
+    
+    # Keep the page for revalidation, dropping the least recently used:
+    etag          = res.headers.get('ETag')
+    last_modified = res.headers.get('Last-Modified')
+    if etag != None or last_modified != None:
+        with cache_lock:
+            page_cache[url] = {'etag': etag, 'last_modified': last_modified, 'content': res.content}
+            page_cache.move_to_end(url)
+            while len(page_cache) > cache_size:
+                page_cache.popitem(last=False)
+    
+    return res.content
+
+
+def find_params(content):
+    """
+    Return the text (str) of the script element with id 'params'
+    in the leiturajornal page `content` (bytes), which holds a 
+    JSON object with the day's article list ('jsonArray'). The 
+    element is found by scanning the bytes, without parsing 
+    the HTML.
+    """
+    
+    tag_start = content.find(b'id="params"')
+    if tag_start == -1:
+        tag_start = content.find(b"id='params'")
+    if tag_start == -1:
+        raise ValueError("Could not find the 'params' element in the page.")
+    
+    start = content.find(b'>', tag_start) + 1
+    end   = content.find(b'</script>', start)
+    if start == 0 or end == -1:
+        raise ValueError("The 'params' element is not closed: the page is truncated.")
+    
+    return content[start:end].decode('utf-8')
+
+
+def json_array_decoder(fields=None):
+    """
+    Return a JSON decoder that builds no dicts: if `fields` is 
+    None, JSON objects are decoded to None; otherwise, to a tuple 
+    with the values of the keys listed in `fields` (list of str),
+    with strings interned (so repeated values are stored once).
+    """
+    
+    if fields == None:
+        return json.JSONDecoder(object_pairs_hook=lambda pairs: None)
+    
+    field_pos = {f: i for i, f in enumerate(fields)}
+    n_fields  = len(fields)
+    
+    def pairs_to_tuple(pairs):
+        row = [None] * n_fields
+        for key, value in pairs:
+            i = field_pos.get(key)
+            if i != None:
+                row[i] = sys.intern(value) if type(value) == str else value
+        return tuple(row)
+    
+    return json.JSONDecoder(object_pairs_hook=pairs_to_tuple)
+
+
+def decode_json_array(params, key='jsonArray', decoder=json.JSONDecoder()):
+    """
+    Decode only the array under `key` (str) in the JSON object 
+    `params` (str), using `decoder` (json.JSONDecoder). The rest 
+    of the object is not parsed.
+    """
+    
+    match = re.search(r'"' + key + r'"\s*:\s*\[', params)
+    if match == None:
+        raise ValueError("Could not find '{}' in the page's params.".format(key))
+    array, end = decoder.raw_decode(params, match.end() - 1)
+    
+    return array
+
+
+def count_json_array(params, key='jsonArray'):
+    """
+    Return the number of entries in the array under `key` (str) 
+    in the JSON object `params` (str), without building them.
+    """
+    
+    return len(decode_json_array(params, key, json_array_decoder()))
+
+
+def extract_json_array(params, fields, key='jsonArray'):
+    """
+    Return a list with one tuple per entry of the array under 
+    `key` (str) in the JSON object `params` (str), containing 
+    only the values of `fields` (list of str), in that order.
+    """
+    
+    return decode_json_array(params, key, json_array_decoder(fields))
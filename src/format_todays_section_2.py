@@ -24,11 +24,73 @@ import subprocess
 #import google.auth
 import os
 import csv
+from concurrent.futures import ProcessPoolExecutor
 
 import random_zaplink as rz
 import auxiliar as aux
 
 
+### HARD-CODED CLEANING RULES ###
+
+# Identification numbers to remove from the acts:
+siape_regex    = r',?\s*?(?:(?:matr[íi]cula)?\s*siape(?:cad)?|matr[íi]cula)\s*?n?.?\s*?(\d{5,7}),?'
+cpf_regex      = r',?\s*?cpf\s*?n?\.?.?\s*?([\d.*-]{14,18}),?'
+no_regex       = r',?\s*?c[oó]digo\s*?n.? ?[\.\d]{5,7},?'
+processo_regex = r'(?:,?\s*?conforme\s*?|[\s\-.]*?)\(?Processo\s*?(?:SEI)?\s*?n?.?\s*?[\d.\-/]{15,20}\)?'
+
+# Infinitive -> present tense of the acts' main verbs:
+verb_regex_repl = [(r'nomear ?(,?)\s*',    r'Nomeia\1 '), 
+                   (r'exonerar ?(,?)\s*',  r'Exonera\1 '), 
+                   (r'designar ?(,?)\s*',  r'Designa\1 '), 
+                   (r'dispensar ?(,?)\s*', r'Dispensa\1 ')]
+
+# Cargo tags (prefix, regex whose group 1 is the cargo level):
+cargo_prefix_regex = [('DAS ',    r',?\s*?(?:c[óo]digo)?\s*?das[ -]*?[0123]{3}\.([1-6]),?'), 
+                      ('CA ',     r',?\s*?(?:c[óo]digo)?\s*?ca[ -]+?(i{1,4})(?:\W|$),?'),
+                      ('CA-APO ', r',?\s*?(?:c[óo]digo)?\s*?ca-apo[ -]*?([12]),?'),
+                      ('',        r',?\s*?(?:c[óo]digo)?\s*?\W(CDT)\W,?'),
+                      ('CCD ',    r',?\s*?(?:c[óo]digo)?\s*?ccd[ -]+?(i{1,3})(?:\W|$),?'),
+                      ('CGE ',    r',?\s*?(?:c[óo]digo)?\s*?cge[ -]+?(i{1,3})(?:\W|$),?'),
+                      ('',        r',?\s*?(?:c[óo]digo)?\s*?(CPAGLO),?'),
+                      ('',        r',?\s*?(?:c[óo]digo)?\s*?\W(CSP)(?:\W|$),?'),
+                      ('',        r',?\s*?(?:c[óo]digo)?\s*?\W(CSU)(?:\W|$),?'),
+                      ('CD ',     r',?\s*?(?:c[óo]digo)?\s*?\Wcd(?:[ -]*?|\.)([123])(?:\W|$),?'),
+                      ('',        r',?\s*?(?:c[óo]digo)?\s*?\W(NE)(?:\W|$),?'),
+                      ('CETG ',   r',?\s*?(?:c[óo]digo)?\s*?cetg[ -]*?(iv|v|vi|vii)(?:\W|$),?'), 
+                      ('FDS ',    r',?\s*?(?:c[óo]digo)?\s*?\Wfds[ -]*?(1)(?:\W|$),?'),
+                      ('FCPE ',   r',?\s*?(?:c[óo]digo)?\s*?fc?pe[ -]*?[0-9]{3}\.([1-6]),?'),
+                      ('',        '(natureza especial)'),
+                      ('CNE ',    r',?\s*?(?:c[óo]digo)?\s*?cne[ -]*?([0-9]{2}),?'),
+                      ('CCE ',     r',?\s*?(?:c[óo]digo)?\s*?cce[ -]*?[1-3]{1}\.([0-9]{1,2}),?'),
+                      ('FCE ',     r',?\s*?(?:c[óo]digo)?\s*?fce[ -]*?[1-3]{1}\.([0-9]{1,2}),?')]
+
+# Preamble of a cargo/função in exoneração/dispensa acts:
+exit_cargo_preamble  = '(do\s*?cargo\s*?(?:em\s*?comissão|comissionado)?\s*?de)'
+exit_funcao_preamble = '(da\s*?função\s*?comissionada\s*?(?:do\s*?poder\s*?executivo)?\s*?de)'
+
+# Preamble of a cargo/função in nomeação/designação acts (e.g. 'para exercer o cargo de'):
+enter_cargo_preamble_0 = ',?\s*?para\s*?(?:exercer|ocupar)\s*?'
+enter_cargo_comissao   = 'o?\s*?cargo\s*?(?:em\s*?comiss[aã]o|comissionado)?'
+enter_cargo_funcao     = 'a?\s*?fun[cç][aã]o(?:\s*?comissionada)?(?:\s*?do\s*?poder\s*?executivo)?'
+enter_cargo_preamble_1 = '\s*?de'
+enter_cargo_preamble   = enter_cargo_preamble_0 + '(?:' + enter_cargo_funcao + '|' + enter_cargo_comissao + ')' \
+                       + enter_cargo_preamble_1
+
+# Names (regexes) of órgãos and their acronyms, in order of precedence:
+orgao_sigla_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../data/correspondencia_orgao_sigla_DOU_2.csv')
+with open(orgao_sigla_path, 'r', encoding='utf-8') as f:
+    orgao_sigla = [(row['regex'], row['sigla']) for row in csv.DictReader(f)]
+orgao_list = [name for name, acronym in orgao_sigla]
+sigla_list = [acronym for name, acronym in orgao_sigla]
+
+# Dates starting with 'a partir de' or 'a contar de':
+mes_list   = ['janeiro', 'fevereiro', 'mar[cç]o', 'abril', 'maio', 'junho', 'julho', 'agosto', 'setembro', 
+              'outubro', 'novembro', 'dezembro']
+mes_regex  = '(?:' + '|'.join(mes_list) + ')'
+data_regex = r',? a (?:partir|contar) de (?:\d{1,2}.? de ' + mes_regex + ' de (?:20|19)\d{2}|\d{1,2}/\d{1,2}/\d{4}),?'
+data_regex = data_regex.replace(' ', '\s*?')
+
+
 ### FUNCTIONS ###
 
 def bigquery_to_pandas(query, project='gabinete-compartilhado', 
@@ -51,7 +113,7 @@ def bigquery_to_pandas(query, project='gabinete-compartilhado',
     """
 
     # Set authorization to access GBQ and gDrive:
-    credentials = aux.load_gcp_credentials(credentials_file)
+    credentials = aux.get_gcp_credentials(credentials_file)
         
     return pd.read_gbq(query, project_id=project, dialect='standard', credentials=credentials)
 
@@ -187,7 +249,6 @@ def remove_siape(text_series):
     Remove SIAPE code (and related terms) from all rows in 
     `text_series`.
     """
-    siape_regex = r',?\s*?(?:(?:matr[íi]cula)?\s*siape(?:cad)?|matr[íi]cula)\s*?n?.?\s*?(\d{5,7}),?'
     return remove_pattern(text_series, siape_regex)
 
 
@@ -196,17 +257,14 @@ def remove_cpf(text_series):
     Remove CPF number (and related terms) from all rows in 
     `text_series`.
     """
-    cpf_regex = r',?\s*?cpf\s*?n?\.?.?\s*?([\d.*-]{14,18}),?'
     return remove_pattern(text_series, cpf_regex)
 
 
 def remove_no(text_series):
-    no_regex = r',?\s*?c[oó]digo\s*?n.? ?[\.\d]{5,7},?'
     return remove_pattern(text_series, no_regex)
 
 
 def remove_processo(text_series):
-    processo_regex = r'(?:,?\s*?conforme\s*?|[\s\-.]*?)\(?Processo\s*?(?:SEI)?\s*?n?.?\s*?[\d.\-/]{15,20}\)?'
     return remove_pattern(text_series, processo_regex)
 
 
@@ -216,10 +274,8 @@ def fix_verbs(text_series):
     by present tense.
     """
     clean_series = text_series.copy()
-    clean_series = clean_series.str.replace(r'nomear ?(,?)\s*', r'Nomeia\1 ', case=False)
-    clean_series = clean_series.str.replace(r'exonerar ?(,?)\s*', r'Exonera\1 ', case=False)
-    clean_series = clean_series.str.replace(r'designar ?(,?)\s*', r'Designa\1 ', case=False)
-    clean_series = clean_series.str.replace(r'dispensar ?(,?)\s*', r'Dispensa\1 ', case=False)
+    for regex, present in verb_regex_repl:
+        clean_series = clean_series.str.replace(regex, present, case=False)
     return clean_series
 
 
@@ -249,32 +305,130 @@ def standardize_cargos(text_series):
     Standardize and simplify parts of text in `text_series` 
     (Pandas Series) describing cargos.
     """
-    prefix_regex = [('DAS ',    r',?\s*?(?:c[óo]digo)?\s*?das[ -]*?[0123]{3}\.([1-6]),?'), 
-                    ('CA ',     r',?\s*?(?:c[óo]digo)?\s*?ca[ -]+?(i{1,4})(?:\W|$),?'),
-                    ('CA-APO ', r',?\s*?(?:c[óo]digo)?\s*?ca-apo[ -]*?([12]),?'),
-                    ('',        r',?\s*?(?:c[óo]digo)?\s*?\W(CDT)\W,?'),
-                    ('CCD ',    r',?\s*?(?:c[óo]digo)?\s*?ccd[ -]+?(i{1,3})(?:\W|$),?'),
-                    ('CGE ',    r',?\s*?(?:c[óo]digo)?\s*?cge[ -]+?(i{1,3})(?:\W|$),?'),
-                    ('',        r',?\s*?(?:c[óo]digo)?\s*?(CPAGLO),?'),
-                    ('',        r',?\s*?(?:c[óo]digo)?\s*?\W(CSP)(?:\W|$),?'),
-                    ('',        r',?\s*?(?:c[óo]digo)?\s*?\W(CSU)(?:\W|$),?'),
-                    ('CD ',     r',?\s*?(?:c[óo]digo)?\s*?\Wcd(?:[ -]*?|\.)([123])(?:\W|$),?'),
-                    ('',        r',?\s*?(?:c[óo]digo)?\s*?\W(NE)(?:\W|$),?'),
-                    ('CETG ',   r',?\s*?(?:c[óo]digo)?\s*?cetg[ -]*?(iv|v|vi|vii)(?:\W|$),?'), 
-                    ('FDS ',    r',?\s*?(?:c[óo]digo)?\s*?\Wfds[ -]*?(1)(?:\W|$),?'),
-                    ('FCPE ',   r',?\s*?(?:c[óo]digo)?\s*?fc?pe[ -]*?[0-9]{3}\.([1-6]),?'),
-                    ('',        '(natureza especial)'),
-                    ('CNE ',    r',?\s*?(?:c[óo]digo)?\s*?cne[ -]*?([0-9]{2}),?'),
-                    ('CCE ',     r',?\s*?(?:c[óo]digo)?\s*?cce[ -]*?[1-3]{1}\.([0-9]{1,2}),?'),
-                    ('FCE ',     r',?\s*?(?:c[óo]digo)?\s*?fce[ -]*?[1-3]{1}\.([0-9]{1,2}),?')]
-    
     new_text_series = text_series.copy()
-    for prefix, regex in prefix_regex:
+    for prefix, regex in cargo_prefix_regex:
         new_text_series = new_text_series.str.replace(regex, ' (' + prefix + r'\1)', case=False)
 
     return new_text_series
 
 
+def is_literal(regex):
+    """
+    Whether `regex` (str) has no special characters, i.e. 
+    it only matches its own text.
+    """
+    return re.search(r'[\\.^$*+?{}\[\]|()]', regex) == None
+
+
+def expand_literals(regex, max_expansions=64):
+    """
+    If `regex` (str) is made only of literal text and simple 
+    character classes (e.g. 'Ministr[ao] de Estado'), return 
+    the list of all texts it matches (e.g. ['Ministro de Estado', 
+    'Ministra de Estado']); otherwise, or if there are more than
+    `max_expansions` (int) of them, return None.
+    """
+    
+    pieces = re.split(r'\[([^\]\\^-]+)\]', regex)
+    # Literal pieces are at even positions, character classes at odd ones:
+    if not all(is_literal(piece) for piece in pieces[::2]):
+        return None
+    
+    expansions = ['']
+    for j, piece in enumerate(pieces):
+        options    = list(piece) if j % 2 == 1 else [piece]
+        expansions = [e + o for e in expansions for o in options]
+        if len(expansions) > max_expansions:
+            return None
+    
+    return expansions
+
+
+def build_label_index(orgao_label_df):
+    """
+    Compile the regex-label correspondence in `orgao_label_df` 
+    (Pandas DataFrame with columns 'regex' and 'label') into 
+    an index for finding, in a single pass over a text, all 
+    the rules whose regex is present in it.
+    
+    The literal regexes (most of them), as well as those with 
+    only simple character classes (expanded into all the texts 
+    they match, see `expand_literals`), are stored in a 
+    character trie: each node is a dict from the next character 
+    to the child node, and the key None holds the numbers of the 
+    rules that end there. The other regexes are compiled and 
+    searched for separately.
+    
+    Returns a dict with the 'trie', the compiled non-literal 
+    'regexes' (list of (rule number, compiled regex)) and the
+    'labels' (list of str), in the order of `orgao_label_df`.
+    """
+    
+    trie    = {}
+    regexes = []
+    labels  = []
+    for i in range(len(orgao_label_df)):
+        regex = orgao_label_df.loc[i, 'regex']
+        labels.append(orgao_label_df.loc[i, 'label'])
+        literals = expand_literals(regex)
+        if literals != None:
+            for literal in literals:
+                node = trie
+                for char in literal:
+                    node = node.setdefault(char, {})
+                node.setdefault(None, []).append(i)
+        else:
+            regexes.append((i, re.compile(regex)))
+    
+    return {'trie': trie, 'regexes': regexes, 'labels': labels}
+
+
+def matching_rules(text, label_index):
+    """
+    Return the sorted list of the numbers of the rules in 
+    `label_index` (dict built by `build_label_index`) whose 
+    regex is found in `text` (str), walking the trie from 
+    each position of the text.
+    """
+    
+    trie    = label_index['trie']
+    n_chars = len(text)
+    
+    matched = set()
+    for start in range(n_chars):
+        node = trie.get(text[start])
+        pos  = start + 1
+        while node != None:
+            if None in node:
+                matched.update(node[None])
+            if pos == n_chars:
+                break
+            node = node.get(text[pos])
+            pos  = pos + 1
+    
+    for i, regex in label_index['regexes']:
+        if regex.search(text) != None:
+            matched.add(i)
+    
+    return sorted(matched)
+
+
+def relabel(rules, current_label, labels, input_label):
+    """
+    Return the label resulting from applying, in order, the 
+    matched `rules` (list of rule numbers) to `current_label`, 
+    where each rule changes the label to its own (from `labels`)
+    if the label at that point is in `input_label` (list of str),
+    or if it is None when `input_label` is None.
+    """
+    
+    for i in rules:
+        if (current_label == None if input_label == None else current_label in input_label):
+            current_label = labels[i]
+    
+    return current_label
+
+
 def add_label_to_df(df, orgao_label_df, lookup_col='orgao', label_col='label', input_label=None):
     """
     Modify `df` (Pandas DataFrame) in place by adding a label
@@ -287,25 +441,38 @@ def add_label_to_df(df, orgao_label_df, lookup_col='orgao', label_col='label', i
     of str), use the regex-label correspondence from `orgao_label_df` 
     to modify the value in the `df`'s `label_col` column for rows whose 
     label was previously set to `input_label`.
+    
+    The correspondence is compiled into a trie (see `build_label_index`)
+    so each distinct value in `lookup_col` is looked up only once, in a 
+    single pass, with the same result as trying the patterns one by one,
+    in order.
     """
     
     # Initialize column to None if no input label was provided:
     if input_label == None:
-        df[label_col] = None
+        current_labels = [None] * len(df)
     # Standardize input label: 
-    elif type(input_label) == str:
-        input_label = [input_label]
-
-    for i in range(len(orgao_label_df)):
-
-        # Get one regex-label pair:
-        regex = orgao_label_df.loc[i, 'regex']
-        label = orgao_label_df.loc[i, 'label']
-        
-        if input_label == None:
-            df.loc[df[lookup_col].str.contains(regex) & df[label_col].isnull(), label_col] = label
-        else:
-            df.loc[df[lookup_col].str.contains(regex) & df[label_col].isin(input_label), label_col] = label
+    else:
+        if type(input_label) == str:
+            input_label = [input_label]
+        current_labels = df[label_col].values
+
+    label_index = build_label_index(orgao_label_df)
+    
+    # Label each distinct (lookup value, current label) only once:
+    memo       = {}
+    new_labels = []
+    for value, current_label in zip(df[lookup_col].values, current_labels):
+        # Rows with other labels are not changed:
+        if input_label != None and current_label not in input_label:
+            new_labels.append(current_label)
+            continue
+        key = (value, current_label)
+        if key not in memo:
+            rules = matching_rules(value, label_index) if type(value) == str else []
+            memo[key] = relabel(rules, current_label, label_index['labels'], input_label)
+        new_labels.append(memo[key])
+    df[label_col] = new_labels
     
     # Default:
     df[label_col].fillna('Outros')
@@ -338,19 +505,8 @@ def remove_nomeia_cargo_preamble(text_series):
     
     (e.g. 'para exercer o cargo de')
     """
-    # Regex of the beginning:
-    enter_cargo_preamble_0 = ',?\s*?para\s*?(?:exercer|ocupar)\s*?'
-    # Regex for cargo/função:
-    enter_cargo_comissao   = 'o?\s*?cargo\s*?(?:em\s*?comiss[aã]o|comissionado)?'
-    enter_cargo_funcao     = 'a?\s*?fun[cç][aã]o(?:\s*?comissionada)?(?:\s*?do\s*?poder\s*?executivo)?'
-    # Regex for the final part:
-    enter_cargo_preamble_1 = '\s*?de'
-    # Full regex:
-    preamble_regex = enter_cargo_preamble_0 + '(?:' + enter_cargo_funcao + '|' + enter_cargo_comissao + ')' \
-                   + enter_cargo_preamble_1
-    
     # Remove preamble:
-    new_text_series = text_series.str.replace('(' + preamble_regex + ')', '', case=False)
+    new_text_series = text_series.str.replace('(' + enter_cargo_preamble + ')', '', case=False)
     
     return new_text_series
 
@@ -363,10 +519,6 @@ def simplify_exonera_cargo_preamble(text_series):
     (e.g.: 'do cargo comissioado de' -> 'do cargo de')
     """
     
-    # Regexes:
-    exit_cargo_preamble  = '(do\s*?cargo\s*?(?:em\s*?comissão|comissionado)?\s*?de)'
-    exit_funcao_preamble = '(da\s*?função\s*?comissionada\s*?(?:do\s*?poder\s*?executivo)?\s*?de)'
-    
     # Transform text series:
     new_text_series = text_series.copy()
     new_text_series = new_text_series.str.replace(exit_cargo_preamble, 'do cargo de', case=False)
@@ -417,36 +569,73 @@ def prep_orgao_regex(name, acronym):
     return regex
 
 
+def first_chars(regex):
+    """
+    Return the characters (str) that can start a match of
+    `regex` (str) if it starts with a literal letter or digit
+    or with a simple character class; otherwise, return None.
+    """
+    match = re.match(r'\[([^\]\\^-]+)\]|(\w)(?![?*{])', regex)
+    if match == None:
+        return None
+    
+    return match.group(1) if match.group(2) == None else match.group(2)
+
+
+def build_sigla_regex(orgao_sigla):
+    """
+    Join the órgão names and acronyms in `orgao_sigla` (list 
+    of tuples (name regex, acronym)) into a single regex that 
+    detects any of the names, possibly followed by its acronym
+    (see `prep_orgao_regex`), so all of them can be replaced 
+    in a single scan of a text.
+    
+    Each name is a named group ('orgao_0', 'orgao_1', ...). The
+    names are grouped by their first word, which is matched only 
+    once for all names in the group, and the regex starts with a 
+    lookahead for the characters that can start a name (when 
+    known), so most positions in a text are skipped at once and 
+    the cost of a scan barely grows with the number of órgãos. 
+    Names found at the same position are preferred in the order
+    of their first words' first appearance, and then in the 
+    order of `orgao_sigla`.
+    
+    Returns the regex (str) and a dict from group name to 
+    acronym (str).
+    """
+    
+    groups = {}
+    siglas = {}
+    for i, (name, acronym) in enumerate(orgao_sigla):
+        first_word = name.split(' ')[0]
+        rest       = prep_orgao_regex(name, acronym)[len(first_word):]
+        groups.setdefault(first_word, []).append('(?P<orgao_{}>{})'.format(i, rest))
+        siglas['orgao_{}'.format(i)] = acronym
+    regex = '(?:' + '|'.join(first_word + '(?:' + '|'.join(names) + ')' for first_word, names in groups.items()) + ')'
+    
+    starts = [first_chars(first_word) for first_word in groups]
+    if None not in starts:
+        regex = '(?=[' + re.escape(''.join(sorted(set(''.join(starts))))) + '])' + regex
+    
+    return regex, siglas
+
+
+def replace_orgao_name(match):
+    """
+    Return the acronym of the órgão found by `match` (re.Match
+    of `orgao_sigla_regex`).
+    """
+    return orgao_siglas[match.lastgroup]
+
+
 def name_to_sigla(text_series):
     """
     Replace long reference of a orgão (name + possible acronym)
-    by its acronym in a `text_series`. All orgãos are hard-coded. 
-    """
-
-    # Hard-coded acronyms and names of órgãos:
-    sigla_list = ['FNDE', 'IBAMA', 'ICMBio', 'INCRA', 'FUNAI', 'CAPES', 'INEP', 
-                  'CNPq', 'ABIN', 'INSS', 'IBGE', 'ANATEL', 'CADE', 'FUNASA']
-    orgao_list = ['Fundo Nacional de Desenvolvimento da Educa[cç][aã]o',
-                  'Instituto Brasileiro do Meio Ambiente e dos Recursos Naturais Renov[aá]veis',
-                  'Instituto Chico Mendes de Conserva[cç][aã]o da Biodiversidade',
-                  'Instituto Nacional de Coloniza[cç][aã]o e Reforma Agr[aá]ria',
-                  'Funda[cç][aã]o Nacional do [IÍ]ndio',
-                  'Coordena[cç][aã]o de Aperfei[cç]oamento de Pessoal de N[ií]vel Superior',
-                  'Instituto Nacional de Estudos e Pesquisas Educacionais An[ií]sio Teixeira',
-                  'Conselho Nacional de Desenvolvimento Cient[ií]fico e Tecnol[oó]gico',
-                  'Ag[eê]ncia Brasileira de Intelig[eê]ncia',
-                  'Instituto Nacional do Seguro Social', 
-                  'Fundação Instituto Brasileiro de Geografia e Estatística', 
-                  'Agência Nacional de Telecomunicações',
-                  'Conselho Administrativo de Defesa Econômica',
-                  'Fundação Nacional de Saúde']
-    
-    # Create robust regexes out of name and acronym:
-    regex_list = [prep_orgao_regex(name, acronym) for name, acronym in zip(orgao_list, sigla_list)]
-    
-    new_text_series = text_series.copy()
-    for regex, sigla in zip(regex_list, sigla_list):
-        new_text_series = new_text_series.str.replace(regex, sigla, case=False)
+    by its acronym in a `text_series`, in a single scan of each 
+    text. The orgãos are listed in `orgao_sigla_path`. 
+    """
+
+    new_text_series = text_series.str.replace(orgao_sigla_regex, replace_orgao_name)
     
     return new_text_series
 
@@ -456,13 +645,6 @@ def remove_dates(text_series):
     Remove references to dates that start with 'a partir de'
     or 'a contar de'.
     """
-    # Preparing regex:
-    mes_list = ['janeiro', 'fevereiro', 'mar[cç]o', 'abril', 'maio', 'junho', 'julho', 'agosto', 'setembro', 
-                'outubro', 'novembro', 'dezembro']
-    mes_regex = '(?:' + '|'.join(mes_list) + ')'
-    data_regex = r',? a (?:partir|contar) de (?:\d{1,2}.? de ' + mes_regex + ' de (?:20|19)\d{2}|\d{1,2}/\d{1,2}/\d{4}),?'
-    data_regex = data_regex.replace(' ', '\s*?')
-    
     new_text_series = text_series.str.replace(data_regex, '', case=False)
     
     return new_text_series
@@ -504,6 +686,170 @@ def assign_emoji(act_text):
     return '▪️'
 
 
+def compile_rules(rules, flags=re.IGNORECASE):
+    """
+    Compile a list of cleaning `rules`, tuples (regex, replacement, 
+    guards), into a list of tuples (compiled regex, replacement, 
+    guards), where `guards` is a tuple of literals (str, lowercase)
+    at least one of which is present in any text matched by the 
+    regex (or None, if the regex must always be applied).
+    """
+    return [(re.compile(regex, flags), repl, guards) for regex, repl, guards in rules]
+
+
+def apply_rules(text, folded, compiled_rules):
+    """
+    Apply the `compiled_rules` (list of tuples built by `compile_rules`)
+    to `text` (str), in order, skipping the rules whose guards are not 
+    found in `folded` (the casefolded `text`).
+    
+    Returns the new text and its casefolded version.
+    """
+    for regex, repl, guards in compiled_rules:
+        if guards == None or any(g in folded for g in guards):
+            text, n_subs = regex.subn(repl, text)
+            if n_subs > 0:
+                folded = fold_text(text)
+    
+    return text, folded
+
+
+def fold_text(text):
+    """
+    Casefold `text` (str) for checking the rules' guards ('ı' 
+    is matched to 'i' by case-insensitive regexes).
+    """
+    return text.casefold().replace('ı', 'i')
+
+
+# Rules applied to every act, in order (same as `remove_siape`, `remove_cpf`, 
+# `remove_no`, `remove_processo`, `fix_verbs` and `standardize_cargos`):
+act_head_rules = compile_rules([(siape_regex,    '', ('siape', 'matr')),
+                                (cpf_regex,      '', ('cpf',)),
+                                (no_regex,       '', ('digo',)),
+                                (processo_regex, '', ('processo',))] +
+                               [(regex, present, (regex[:regex.index(' ')],)) for regex, present in verb_regex_repl] +
+                               [(regex, ' (' + prefix + r'\1)', guards) for (prefix, regex), guards in 
+                                zip(cargo_prefix_regex, [('das',), ('ca ', 'ca-'), ('ca-apo',), ('cdt',), ('ccd',), ('cge',), ('cpaglo',), 
+                                                         ('csp',), ('csu',), ('cd',), ('ne',), ('cetg',), ('fds',), ('fcpe', 'fpe'), 
+                                                         ('natureza especial',), ('cne',), ('cce',), ('fce',)])])
+# Rules applied to exoneração/dispensa and to nomeação/designação acts (as `simplify_cargo_preamble`):
+exonera_start = re.compile('^(?:exonera|dispensa)', re.IGNORECASE)
+nomeia_start  = re.compile('^(?:nomeia|designa)', re.IGNORECASE)
+exonera_rules = compile_rules([(exit_cargo_preamble,  'do cargo de',  ('cargo',)),
+                               (exit_funcao_preamble, 'da função de', ('comissionada',))])
+nomeia_rules  = compile_rules([('(' + enter_cargo_preamble + ')', '', ('para',))])
+# Single regex for replacing all órgão names by their acronyms:
+orgao_sigla_pattern, orgao_siglas = build_sigla_regex(orgao_sigla)
+orgao_sigla_regex = re.compile(orgao_sigla_pattern, re.IGNORECASE)
+# Rules applied to every act at the end (as `name_to_sigla` and `remove_dates`):
+act_tail_rules = compile_rules([(orgao_sigla_pattern, replace_orgao_name, None),
+                                (data_regex,          '',                 ('partir', 'contar'))])
+
+
+def clean_act(text):
+    """
+    Clean the `text` (str) of a nomeação/exoneração/etc act 
+    with all cleaning rules, precompiled, in a single pass 
+    over the rules. The result is the same as applying 
+    `remove_siape`, `remove_cpf`, `remove_no`, `remove_processo`,
+    `fix_verbs`, `standardize_cargos`, `simplify_cargo_preamble`,
+    `name_to_sigla` and `remove_dates`, in this order.
+    """
+    
+    folded = fold_text(text)
+    text, folded = apply_rules(text, folded, act_head_rules)
+    if exonera_start.search(text) != None:
+        text, folded = apply_rules(text, folded, exonera_rules)
+    elif nomeia_start.search(text) != None:
+        text, folded = apply_rules(text, folded, nomeia_rules)
+    text, folded = apply_rules(text, folded, act_tail_rules)
+    
+    return text
+
+
+def clean_acts(text_series):
+    """
+    Apply `clean_act` to every str in `text_series` (Pandas 
+    Series), in a single traversal, keeping the index. Missing 
+    values are kept as they are.
+    """
+    
+    cleaned = [clean_act(text) if type(text) == str else text for text in text_series.values]
+    
+    return pd.Series(cleaned, index=text_series.index, name=text_series.name, dtype=object)
+
+
+# Hard-coded tokens that classify an act (verbs, cargo tags and other keywords), 
+# all found in a single case-insensitive scan of its text (see `classify_act`). The 
+# lookahead skips quickly the positions where no token can start:
+act_token_regex = re.compile(r'(?=[\n( ndespgcab])(?:(?P<newline>\n)|(?P<enter>Nomeia|Designa)|(?P<exit>Exonera|Dispensa)'
+                             r'|\((?:DAS|FCPE) (?P<das_level>[456])\)|\((?:CCE|FCE) (?P<cce_level>1[3-8])\)'
+                             r'|(?P<ca>\((?:CA|CGE) I{1,3}\)|\(CDT\))|(?P<secretario> Secretári)|(?P<substitu>substitu)'
+                             r'|(?P<police>pol[ií]cia\s*?(?:rodovi[aá]ria)?\s*?federal)'
+                             r'|(?P<colegiado>grupo de trabalho|comitê|conselho|comissão|grupo gestor)'
+                             r'|(?P<militar>General|Almirante|Brigadeiro))', re.IGNORECASE)
+# Cargo level of each tag level:
+cargo_levels = {'6': 'alto', '17': 'alto', '18': 'alto', '5': 'medio', '15': 'medio', '16': 'medio', 
+                '4': 'baixo', '13': 'baixo', '14': 'baixo'}
+# Importance of each cargo tag (exact case), in order of priority (as in `act_importance`):
+tag_importance = {'(DAS 6)': (0, 6), '(DAS 5)': (1, 5), '(DAS 4)': (2, 4), 
+                  '(FCPE 6)': (3, 6), '(FCPE 5)': (4, 5), '(FCPE 4)': (5, 4),
+                  '(CGE I)': (6, 5), '(CGE II)': (7, 4)}
+# Decision table from act features (keyword, or verb class and cargo level found 
+# after it in the same line) to emoji, ordered by preference (as in `assign_emoji`):
+emoji_table = [('substitu', '⏱️'), ('police', '👮🏻'), 
+               (('enter', 'alto'), '👑'), (('enter', 'medio'), '🎩'), (('enter', 'baixo'), '🧢'), 
+               (('exit', 'alto'), '💼'),  (('exit', 'medio'), '🧳'),  (('exit', 'baixo'), '🎒'), 
+               ('ca', '👓'), ('colegiado', '💬'), ('militar', '👨🏻‍✈️'), 
+               (('enter', 'secretario'), '👑'), (('exit', 'secretario'), '💼')]
+
+
+def classify_act(text):
+    """
+    Return the importance (int) and the emoji (str) of an 
+    act `text` (str), the same as `act_importance` and 
+    `assign_emoji`, with a single scan of the text for all 
+    the tokens they look for.
+    """
+    
+    features   = set()
+    line_verbs = set()
+    importance = (len(tag_importance), 0)
+    for match in act_token_regex.finditer(text):
+        kind = match.lastgroup
+        if kind == 'newline':
+            line_verbs = set()
+        elif kind == 'enter' or kind == 'exit':
+            line_verbs.add(kind)
+        elif kind in ('das_level', 'cce_level', 'secretario'):
+            level = 'secretario' if kind == 'secretario' else cargo_levels[match.group(kind)]
+            features.update((verb, level) for verb in line_verbs)
+            importance = min(importance, tag_importance.get(match.group(), importance))
+        else:
+            features.add(kind)
+            if kind == 'ca':
+                importance = min(importance, tag_importance.get(match.group(), importance))
+    
+    for feature, emoji in emoji_table:
+        if feature in features:
+            return importance[1], emoji
+    
+    return importance[1], '▪️'
+
+
+def classify_acts(text_series):
+    """
+    Return a DataFrame with the 'importance' and 'emoji' of 
+    each act in `text_series` (Pandas Series of str), with 
+    the same index (see `classify_act`).
+    """
+    
+    classes = [classify_act(text) for text in text_series.values]
+    
+    return pd.DataFrame(classes, index=text_series.index, columns=['importance', 'emoji'])
+
+
 def prepare_with_acts(materia_series, act_regex):
     """
     Process `materia_series` (Pandas Series) of matérias from DOU that 
@@ -525,19 +871,8 @@ def prepare_with_acts(materia_series, act_regex):
     # Filter acts containing only low cargos:
     filtered_acts = filter_low_cargos(raw_acts)
 
-    # Remove unwanted information:
-    cleaned_acts  = filtered_acts
-    cleaned_acts  = remove_siape(cleaned_acts)
-    cleaned_acts  = remove_cpf(cleaned_acts)
-    cleaned_acts  = remove_no(cleaned_acts)
-    cleaned_acts  = remove_processo(cleaned_acts)
-    
-    # Clean text:
-    cleaned_acts  = fix_verbs(cleaned_acts)
-    cleaned_acts  = standardize_cargos(cleaned_acts)
-    cleaned_acts  = simplify_cargo_preamble(cleaned_acts)
-    cleaned_acts  = name_to_sigla(cleaned_acts)
-    cleaned_acts  = remove_dates(cleaned_acts)
+    # Remove unwanted information and clean text (all rules at once):
+    cleaned_acts  = clean_acts(filtered_acts)
     
     return cleaned_acts
 
@@ -554,6 +889,65 @@ def prepare_no_acts(materia_series):
     return cleaned_non_acts
 
 
+def prepare_materias(materia_series, act_regex):
+    """
+    Split `materia_series` (Pandas Series) of matérias from DOU 
+    into those that contain the pattern `act_regex` and those 
+    that do not, and clean them with `prepare_with_acts` and 
+    `prepare_no_acts`, respectively.
+    
+    Returns the two cleaned Pandas Series, with the indices of
+    the original matérias.
+    """
+    
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        
+        has_act = materia_series.str.contains(act_regex, case=False)
+        cleaned_with_acts = prepare_with_acts(materia_series.loc[has_act], act_regex)
+        cleaned_no_acts   = prepare_no_acts(materia_series.loc[~has_act])
+    
+    return cleaned_with_acts, cleaned_no_acts
+
+
+def prepare_materias_in_chunks(materia_series, act_regex, n_workers=None, chunks_per_worker=4, executor=None):
+    """
+    Same as `prepare_materias`, but splitting `materia_series` 
+    into consecutive chunks that are cleaned in parallel, in a 
+    pool of `n_workers` (int) processes (if None, one per CPU). 
+    Each worker gets about `chunks_per_worker` (int) chunks, so 
+    they are kept busy even if some chunks take longer. If 
+    `executor` (ProcessPoolExecutor with `n_workers` processes)
+    is given, it is used instead of starting a new pool, e.g. 
+    to reuse the same pool for many days of matérias.
+    
+    The cleaned chunks are put back together in their original
+    order, so the result is the same as `prepare_materias`'.
+    """
+    
+    if n_workers == None:
+        n_workers = os.cpu_count()
+    if executor == None:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            return prepare_materias_in_chunks(materia_series, act_regex, n_workers, chunks_per_worker, executor)
+    
+    # Split into chunks:
+    n_chunks   = max(min(n_workers * chunks_per_worker, len(materia_series)), 1)
+    chunk_size = max(-(-len(materia_series) // n_chunks), 1)
+    chunks     = [materia_series.iloc[i:i + chunk_size] for i in range(0, len(materia_series), chunk_size)]
+    
+    # Clean the chunks in parallel:
+    results = list(executor.map(prepare_materias, chunks, [act_regex] * len(chunks)))
+    if len(results) == 0:
+        return prepare_materias(materia_series, act_regex)
+    
+    # Reassemble the chunks, in order:
+    cleaned_with_acts = pd.concat([with_acts for with_acts, no_acts in results])
+    cleaned_no_acts   = pd.concat([no_acts for with_acts, no_acts in results])
+    
+    return cleaned_with_acts, cleaned_no_acts
+
+
 def sort_orgaos_by_acts_importance(message_df, orgao_importance):
     """
     Define the order of the orgãos in the message, according to 
@@ -665,22 +1059,44 @@ def gen_minister_regex(orgao_label, from_regex='Ministério', to_regex='Ministr[
     return ministro_label
 
 
+def relabel_by_text(message_df, orgao_label, input_label=['Atos do Executivo', 'Presidência']):
+    """
+    Modify `message_df` (DataFrame) in place by changing the 
+    'section' of the acts labelled as `input_label` (list of str)
+    according to the órgãos (from `orgao_label`, DataFrame) and 
+    to the ministers of those órgãos (see `gen_minister_regex`) 
+    found in their 'text'. 
+    
+    Both rule sets are merged (órgãos first) and applied in a 
+    single scan of each text, with the same result as applying 
+    them one set after the other.
+    """
+    
+    ministro_label = gen_minister_regex(orgao_label)
+    text_label     = pd.concat([orgao_label, ministro_label], ignore_index=True)
+    
+    add_label_to_df(message_df, text_label, lookup_col='text', label_col='section', input_label=input_label)
+
+
 def build_message_df(cleaned_texts, articles_df):
     """
     Use the prepared texts in `cleaned_texts` (Series of str)
     and relevant information from `articles_df` (DataFrame of ranked
     DOU articles) to build a DataFrame with zap message information.
     """
+    act_classes = classify_acts(cleaned_texts)
+    
     message_df = pd.DataFrame()
     message_df['text']       = cleaned_texts
-    message_df['importance'] = cleaned_texts.apply(act_importance)
+    message_df['importance'] = act_classes['importance'].values
+    message_df['emoji']      = act_classes['emoji'].values
     message_df['section']    = articles_df['label'][cleaned_texts.index]
     message_df['url']        = articles_df['url'][cleaned_texts.index]
 
     return message_df
 
 
-def process_ranked_articles(articles_df, orgao_label, verbose=False):
+def process_ranked_articles(articles_df, orgao_label, verbose=False, parallel=False, n_workers=None, executor=None):
     """
     Clean DataFrame of manually ranked section 2 DOU articles
     and build a DataFrame with post content.
@@ -697,6 +1113,16 @@ def process_ranked_articles(articles_df, orgao_label, verbose=False):
     verbose : bool
         Whether or not to print log messages along the funcion
         execution.
+    parallel : bool
+        Whether to clean the matérias in chunks, in a pool of 
+        processes (useful for many days of matérias). The result 
+        is the same.
+    n_workers : int or None
+        Number of processes used if `parallel` is True. If None, 
+        use one per CPU.
+    executor : ProcessPoolExecutor or None
+        Pool of `n_workers` processes to use if `parallel` is 
+        True. If None, a new one is started.
         
     Return
     ------
@@ -721,18 +1147,27 @@ def process_ranked_articles(articles_df, orgao_label, verbose=False):
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
     
-        # Get articles with default act detectors:
-        with_act_regex_df = articles_df.loc[articles_df.fulltext.str.contains(act_regex, case=False)]
-        if verbose:
-            print('# matérias (containing act verbs):', len(with_act_regex_df))
-        # Get articles without default act detectors:
-        no_act_regex_df   = articles_df.loc[~articles_df.fulltext.str.contains(act_regex, case=False)]
-        if verbose:
-            print('# matérias (without act verbs):', len(no_act_regex_df))
-    
-        # Clean acts for posting:
-        cleaned_with_acts = prepare_with_acts(with_act_regex_df['fulltext'], act_regex)
-        cleaned_no_acts   = prepare_no_acts(no_act_regex_df['fulltext'])
+        if parallel:
+            # Clean acts for posting, in chunks:
+            cleaned_with_acts, cleaned_no_acts = prepare_materias_in_chunks(articles_df['fulltext'], act_regex, n_workers,
+                                                                            executor=executor)
+            if verbose:
+                print('# matérias (containing act verbs):', len(articles_df) - len(cleaned_no_acts))
+                print('# matérias (without act verbs):', len(cleaned_no_acts))
+        
+        else:
+            # Get articles with default act detectors:
+            with_act_regex_df = articles_df.loc[articles_df.fulltext.str.contains(act_regex, case=False)]
+            if verbose:
+                print('# matérias (containing act verbs):', len(with_act_regex_df))
+            # Get articles without default act detectors:
+            no_act_regex_df   = articles_df.loc[~articles_df.fulltext.str.contains(act_regex, case=False)]
+            if verbose:
+                print('# matérias (without act verbs):', len(no_act_regex_df))
+    
+            # Clean acts for posting:
+            cleaned_with_acts = prepare_with_acts(with_act_regex_df['fulltext'], act_regex)
+            cleaned_no_acts   = prepare_no_acts(no_act_regex_df['fulltext'])
         
         ### Prepare the message:
         if verbose:
@@ -742,10 +1177,8 @@ def process_ranked_articles(articles_df, orgao_label, verbose=False):
         message_with_acts_df = build_message_df(cleaned_with_acts, articles_df)
         message_no_acts_df   = build_message_df(cleaned_no_acts, articles_df)
         
-        # Change section based on orgaos in text:
-        add_label_to_df(message_with_acts_df, orgao_label, lookup_col='text', label_col='section', input_label=['Atos do Executivo', 'Presidência'])
-        ministro_label = gen_minister_regex(orgao_label)
-        add_label_to_df(message_with_acts_df, ministro_label, lookup_col='text', label_col='section', input_label=['Atos do Executivo', 'Presidência'])
+        # Change section based on orgaos (and their ministers) in text:
+        relabel_by_text(message_with_acts_df, orgao_label)
         
         # Concatenate both kinds of messages into a single DataFrame:
         message_df = pd.concat([message_with_acts_df, message_no_acts_df], sort=False)
@@ -754,37 +1187,59 @@ def process_ranked_articles(articles_df, orgao_label, verbose=False):
     return message_df 
 
 
-def write_to_post(media, content):
+def iter_post(message_df, orgao_label, post_date=None):
     """
-    Write `content` (str) to `media`.
+    Generate, piece by piece, the whastapp post containing the 
+    processed data `message_df`, so it can be joined into a str 
+    or written straight to a file.
     
     Input
     -----
-    media : str or file (TextIOWrapper of _io module)
-        Where to write the `content`.
-    content : str
-        String to be written to `media`. If `media` is a string,
-        append the content to the string.
-    
+    message_df : DataFrame
+        DOU articles from section 2, manually ranked and then 
+        cleaned by previous routines.
+    orgao_label : DataFrame
+        DataFrame containing acronyms and name simplifications 
+        for órgãos federais.
+    post_date : date or None
+        The date shown in the post's header. If None, use today.
+        
     Return
     ------
-    updated_media : str or file (TextIOWrapper of _io module)
-        Either return the input string updated with the 
-        new `content` or the input file.
+    
+    pieces : generator of str
+        The consecutive pieces of the post.
     """
     
-    # Write to str:
-    if type(media) == str:
-        media = media + content
+    # Prepare the order in which the orgãos will appear in the message:
+    ordered_sections = sort_orgaos_by_acts_importance(message_df, orgao_label.set_index('label')['importance'])
     
-    # Write to file:
-    else:
-        media.write(content)
+    # Sort the acts by importance once (ties keep their order) and split them by orgão:
+    sorted_df    = message_df.sort_values('importance', ascending=False, kind='mergesort')
+    section_acts = {s: df for s, df in sorted_df.groupby('section', sort=False)}
     
-    return media
+    # Header:
+    if post_date == None:
+        post_date = date.today()
+    yield '♟️ *Alterações em cargos altos' + post_date.strftime(' (%d/%m)') + '* ♟️\n\n'
+
+    # Loop over orgãos:
+    for s in ordered_sections:
+        yield '*' + s + '*\n\n'
+        
+        acts = section_acts[s]
+        for t, e, u in zip(acts['text'].values, acts['emoji'].values, acts['url'].values):
+            yield e + ' ' + t + '\n' + u + '\n\n'
 
+    # Footnote:
+    zap_link = rz.random_zap_link()
+    yield '*Gabinete Compartilhado Acredito*\n_Para se inscrever no boletim, acesse o link:_\n' + zap_link
 
-def create_post(message_df, orgao_label, verbose=False):
+    # Extra emojis for later formatting:
+    yield '\n\n👑🎩🧢👨🏻‍✈️💬▪️💼⚖🎓️➕🧳'
+
+
+def create_post(message_df, orgao_label, verbose=False, post_date=None):
     """
     Write the whastapp post containing the processed data
     `message_df`.
@@ -800,6 +1255,8 @@ def create_post(message_df, orgao_label, verbose=False):
     verbose : bool
         Whether or not to print log messages along the funcion
         execution.
+    post_date : date or None
+        The date shown in the post's header. If None, use today.
         
     Return
     ------
@@ -809,37 +1266,27 @@ def create_post(message_df, orgao_label, verbose=False):
         `message_df` information.
     """
     
-    # Prepare the order in which the orgãos will appear in the message:
-    ordered_sections = sort_orgaos_by_acts_importance(message_df, orgao_label.set_index('label')['importance'])
-    
-    ### Print the message:
     if verbose:
         print('Writing post...')
-    post = ''
-        
-    # Header:
-    today = date.today().strftime(' (%d/%m)')
-    post = write_to_post(post, '♟️ *Alterações em cargos altos' + today + '* ♟️\n\n')
-
-    # Loop over orgãos:
-    for s in ordered_sections:
-        post = write_to_post(post, '*' + s + '*\n\n')
-
-        # Select acts from this section:
-        section_acts = message_df.loc[message_df['section'] == s].sort_values('importance', ascending=False)
-        for t, u in zip(section_acts['text'].values, section_acts['url'].values):
-            # Print message:
-            e = assign_emoji(t)
-            post = write_to_post(post, e + ' ' + t + '\n' + u + '\n\n')
+    post = ''.join(iter_post(message_df, orgao_label, post_date))
 
-    # Footnote:
-    zap_link = rz.random_zap_link()
-    post = write_to_post(post, '*Gabinete Compartilhado Acredito*\n_Para se inscrever no boletim, acesse o link:_\n' + zap_link)
+    return post
 
-    # Extra emojis for later formatting:
-    post = write_to_post(post, '\n\n👑🎩🧢👨🏻‍✈️💬▪️💼⚖🎓️➕🧳')
 
-    return post
+def write_post(media, message_df, orgao_label, verbose=False, post_date=None):
+    """
+    Write the whastapp post containing the processed data 
+    `message_df` to `media` (file or io.StringIO), piece by
+    piece, without building it in memory. The other arguments
+    are the same as in `create_post`.
+    """
+    
+    if verbose:
+        print('Writing post...')
+    for piece in iter_post(message_df, orgao_label, post_date):
+        media.write(piece)
+    
+    return media
 
 
 def etl_section2_post(orgao_label_path='../data/correspondencia_orgao_label_DOU_2.csv', verbose=False):
@@ -878,13 +1325,15 @@ def etl_section2_post(orgao_label_path='../data/correspondencia_orgao_label_DOU_
     return post
 
 
-def gen_post_filename(post_file_prefix='posts/dou_2_'):
+def gen_post_filename(post_file_prefix='posts/dou_2_', post_date=None):
     """
     Generate a filename (with path) starting with
-    `post_file_prefix`, followed by the current date.
-    Returns a str.
+    `post_file_prefix`, followed by `post_date` (date,
+    defaults to the current date). Returns a str.
     """    
-    filename = post_file_prefix + date.today().strftime('%Y-%m-%d') + '.txt'    
+    if post_date == None:
+        post_date = date.today()
+    filename = post_file_prefix + post_date.strftime('%Y-%m-%d') + '.txt'    
     return filename
 
 
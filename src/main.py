@@ -15,6 +15,8 @@ from compute_download_button import compute_download_button
 import htmlhacks as hh
 import df_formatter as ff
 import count_DOU_articles as ca
+import capture_snapshots as cs
+import stage_cache as sc
 import run_python_process as rp
 import create_section_1_post as c1
 import format_todays_section_2 as f2
@@ -41,20 +43,71 @@ def external_link(text, url):
     hh.html(code)
     
     
-@st.cache
-def counts_dataframe(call):
+@st.cache(allow_output_mutation=True)
+def get_stage_cache():
+    """
+    Return the cache of the capture pipeline steps' counts, 
+    shared by all sessions of the app.
+    """
+    
+    # Hard-coded (time-to-live of each step's counts, in seconds):
+    stage_ttls = {'Site': 300, 'Gabi (bot no Slack)': 60, 'Sistema de captura': 60, 
+                  'Cloud da Amazon': 60, 'Cloud do Google': 60, 'Ranqueados pela IA': 300}
+    
+    return sc.StageCache(stage_ttls, on_update=save_stage_snapshot)
+
+
+def save_stage_snapshot(step_name, counts, duration):
+    """
+    Store the `counts` (dict) of the capture pipeline step 
+    `step_name` (str), computed in `duration` seconds, for 
+    following the capture along the day.
+    """
+    
+    cs.save_snapshot(ca.counts_to_dataframe([counts]), {step_name: duration}, ca.brasilia_day(), ca.brasilia_now())
+
+
+def counts_dataframes(call, max_wait=1.0):
+    """
+    Yield (DataFrame, error messages) pairs with the article 
+    counts along the capture pipeline, one more time each time
+    a step finishes, until no step is still being counted (those
+    counted for the first time are shown with placeholders, the 
+    others with their previous counts). Wait at most `max_wait`
+    seconds between yields.
+    """
     
     # Return empty DataFrame:
     if call == 0:
-        df = ca.gen_empty_counts_df()
-        error_msgs = []
-    # Run mapping code:
-    else:
-        #df = ca.gen_empty_counts_df(no_value=np.random.randint(0,600))
-        #error_msgs = []
-        df, error_msgs = ca.count_through_pipeline()
-        
-    return df, error_msgs
+        yield ca.gen_empty_counts_df(), []
+        return
+    
+    # Get counts from cache (recounting the stale ones in the background):
+    cache   = get_stage_cache()
+    refresh = True
+    while True:
+        pending = []
+        df, error_msgs = sc.cached_pipeline_counts(cache, wait=False, pending=pending, refresh=refresh)
+        yield df, error_msgs
+        if len(pending) == 0:
+            return
+        # Only poll the steps already being counted:
+        refresh = False
+        cache.wait_for_update(max_wait)
+
+
+def capture_trends():
+    """
+    Return a list of messages (str) describing the progress
+    of today's capture, from the stored counts snapshots.
+    """
+    
+    try:
+        messages = cs.trend_messages(ca.brasilia_day())
+    except Exception:
+        messages = []
+    
+    return messages
      
 
 def generate_formatters(df):
@@ -88,16 +141,23 @@ def app_main():
         if run_mapper:
             session.map_counter += 1
     
-    # Count articles along the capture pipeline:
-    df, error_msgs = counts_dataframe(session.map_counter)
-    # Display counts DataFrame:
-    try:
-        fmt_funcs = generate_formatters(df)
-        st.dataframe(df.style.format(fmt_funcs).applymap(ff.style_below_step, props='background-color:pink;'))
-    except:
-        st.dataframe(df)
-    for msg in error_msgs:
-        st.error(msg)
+    # Count articles along the capture pipeline, redrawing the table as each step finishes:
+    counts_area = st.empty()
+    for df, error_msgs in counts_dataframes(session.map_counter):
+        with counts_area.container():
+            # Display counts DataFrame:
+            try:
+                fmt_funcs = generate_formatters(df)
+                st.dataframe(df.style.format(fmt_funcs).applymap(ff.style_below_step, props='background-color:pink;'))
+            except:
+                st.dataframe(df)
+            for msg in error_msgs:
+                st.error(msg)
+    # Display capture progress along the day:
+    trends = capture_trends()
+    if len(trends) > 0:
+        with st.expander('Evolução da captura hoje'):
+            st.markdown('\n'.join(['* ' + msg for msg in trends]))
         
     hh.html('<hr />')
 
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Find which DOU articles are missing between the steps of the capture
+pipeline (see `count_DOU_articles.py`), instead of only how many.
+
+Each step is listed once and reduced to the normalized identifiers of
+its articles (the last part of the article URL or file name, e.g.
+'portaria-n-123-de-15-de-setembro-de-2021-345678'), each one tagged
+with its DOU section when the step knows it. No other field is kept.
+Consecutive steps are then compared with set differences.
+
+The DynamoDB steps ('Gabi (bot no Slack)' and 'Sistema de captura')
+are left out: their tables keep every URL ever captured, with no key
+for the publication date, so they cannot be restricted to one day.
+
+Usage: reconcile_captures.py [DATE]
+
+DATE (format YYYY-MM-DD) defaults to today (Brasilia time).
+"""
+
+import sys
+import re
+from concurrent.futures import ThreadPoolExecutor
+import datetime as dt
+
+import auxiliar as aux
+import count_DOU_articles as ca
+import stage_stats as ss
+
+
+# Hard-coded:
+bucket        = 'brutos-publicos'
+bucket_prefix = 'executivo/federal/dou-partitioned/'
+id_regex      = re.compile(r'([^/?#]+?)(?:\.json)?/?(?:[?#].*)?$')
+
+
+### Funções ###
+
+def normalize_id(ref):
+    """
+    Return the normalized identifier (str) of a DOU article
+    given a reference `ref` (str) to it: an URL, an 'urlTitle',
+    or a file key in S3 or Google Storage. The identifier is the
+    last part of the path, lowercase, without extension or query.
+
+    E.g. 'https://www.in.gov.br/web/dou/-/Portaria-123?inheritRedirect=true'
+    -> 'portaria-123'.
+    """
+
+    match = id_regex.search(ref.strip())
+    if match == None:
+        return ref.strip().lower()
+
+    return sys.intern(match.group(1).lower())
+
+
+def site_ids(current_date, all_sections, parallel=True):
+    """
+    Return a dict from normalized article identifier to DOU
+    section (str) for all articles listed in the website for
+    `current_date` (datetime) and sections `all_sections`.
+    """
+
+    url_titles = ca.map_sections(lambda s: ca.get_artigos_do_fields(current_date, s), all_sections, parallel)
+
+    return {normalize_id(row[0]): str(s) for s, rows in url_titles.items() for row in rows if row[0] != None}
+
+
+def s3_ids(current_date):
+    """
+    Return a dict from normalized article identifier to DOU
+    section (str) for all files saved in S3 for `current_date`
+    (datetime), listing them once.
+    """
+
+    s3 = aux.get_aws_client('s3')
+    paginator = s3.get_paginator('list_objects_v2')
+    prefix = bucket_prefix + 'part_data_pub=' + current_date.strftime('%Y-%m-%d') + '/'
+
+    ids = {}
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        ss.record_aws_response(page)
+        ids.update((normalize_id(d['Key']), ca.section_from_key(d['Key'])) for d in page.get('Contents', []))
+
+    return ids
+
+
+def storage_ids(current_date):
+    """
+    Return a dict from normalized article identifier to DOU
+    section (str) for all blobs saved in Google Storage for
+    `current_date` (datetime), asking the API for their names
+    only.
+    """
+
+    storage_client = aux.get_storage_client()
+    prefix = bucket_prefix + 'part_data_pub=' + current_date.strftime('%Y-%m-%d') + '/'
+    blobs  = storage_client.list_blobs(bucket, prefix=prefix, fields='items(name),nextPageToken')
+
+    ids = {}
+    for page in blobs.pages:
+        ss.record()
+        ids.update((normalize_id(blob.name), ca.section_from_key(blob.name)) for blob in page)
+
+    return ids
+
+
+def bigquery_ids(current_date, table):
+    """
+    Return a dict from normalized article identifier to DOU
+    section (str, 'e' for extra editions) for all articles
+    published on `current_date` (datetime) in the BigQuery
+    table `table` (str) of the 'executivo_federal_dou' dataset.
+    """
+
+    query = """
+    SELECT secao, tipo_edicao, url
+    FROM `gabinete-compartilhado.executivo_federal_dou.%(table)s`
+    WHERE data_pub = '%(date)s'
+    """ % {'table': table, 'date': current_date.strftime('%Y-%m-%d')}
+    results = ca.query_bigquery(query)
+
+    return {normalize_id(r['url']): 'e' if r['tipo_edicao'] == 'Extra' else str(r['secao'])
+            for r in results if r['url'] != None}
+
+
+def reconcile_stages(current_date, all_sections):
+    """
+    Return the steps of the capture pipeline to be reconciled,
+    in pipeline order, as a list of (step name, lister, args)
+    tuples. Calling `lister(*args)` returns the step's dict from
+    normalized article identifier to DOU section (or None).
+    """
+
+    listers = {'Site':            (site_ids,    (current_date, all_sections)),
+               'Cloud da Amazon': (s3_ids,      (current_date,)),
+               'Cloud do Google': (storage_ids, (current_date,))}
+    for name, table in ca.bigquery_steps:
+        listers[name] = (bigquery_ids, (current_date, table))
+
+    # The DynamoDB tables have no publication date, so their steps are left out:
+    stages = [(name,) + listers[name] for name, counter, args in ca.capture_stages(current_date, all_sections)
+              if name not in ca.growth_steps]
+
+    return stages
+
+
+def diff_ids(ids_a, ids_b, sections={}):
+    """
+    Given two dicts from normalized article identifier to
+    DOU section (or None), `ids_a` and `ids_b`, return a
+    sorted list of (section, identifier) tuples of the
+    articles in `ids_a` missing from `ids_b`. Sections
+    unknown to `ids_a` are taken from `sections` (dict
+    from identifier to section), if there.
+    """
+
+    missing = ids_a.keys() - ids_b.keys()
+
+    return sorted((str(sections.get(i) if ids_a[i] == None else ids_a[i]), i) for i in missing)
+
+
+def reconcile_captures(current_date=None, all_sections=['1', '2', '3', 'e']):
+    """
+    Find the DOU articles missing between consecutive steps
+    of the capture pipeline.
+
+    Input
+    -----
+    current_date : datetime or None
+        The publication date of the articles. If None, use
+        today (Brasilia time).
+    all_sections : list of str
+        The DOU sections to reconcile.
+
+    Return
+    ------
+    missing : dict
+        For each pair of consecutive steps (tuple of step names)
+        whose identifiers could be listed, a dict with the sorted
+        list of (section, identifier) tuples of the articles in
+        the first step missing from the second ('missing') and of
+        those in the second step missing from the first ('extra').
+    error_msgs : list of str
+        The error messages of the steps that could not be listed.
+    """
+
+    if current_date == None:
+        current_date = ca.brasilia_day()
+
+    # List all steps at once:
+    stages = reconcile_stages(current_date, all_sections)
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        futures = [executor.submit(lister, *args) for name, lister, args in stages]
+
+    stage_ids  = []
+    error_msgs = []
+    for (name, lister, args), future in zip(stages, futures):
+        try:
+            stage_ids.append((name, future.result()))
+        except Exception as e:
+            error_msgs.append('Failed {} listing: {}'.format(name, str(e)))
+
+    # Sections of the articles, from the steps that know them:
+    sections = {}
+    for name, ids in stage_ids:
+        sections.update((i, s) for i, s in ids.items() if s != None and i not in sections)
+
+    # Compare consecutive steps:
+    missing = {}
+    for (name_a, ids_a), (name_b, ids_b) in zip(stage_ids[:-1], stage_ids[1:]):
+        missing[(name_a, name_b)] = {'missing': diff_ids(ids_a, ids_b, sections), 'extra': diff_ids(ids_b, ids_a, sections)}
+
+    return missing, error_msgs
+
+
+def main(args=['script_filename']):
+    """
+    Function that runs this file as a script.
+    `args` (list of str) can be passed to it
+    using sys.argv. Set `n_args` below to
+    the number of arguments the script accepts.
+    """
+    # Hard-coded:
+    n_args = [0, 1]
+
+    # Docstring output:
+    if len(args) - 1 not in n_args:
+        print(__doc__)
+        sys.exit(1)
+
+    # START OF SCRIPT:
+    current_date = None if len(args) == 1 else dt.datetime.strptime(args[1], '%Y-%m-%d')
+    missing, error_msgs = reconcile_captures(current_date)
+
+    for (name_a, name_b), diffs in missing.items():
+        print('\033[1m{} -> {}:\033[0m {} faltando, {} a mais'.format(name_a, name_b, len(diffs['missing']), len(diffs['extra'])))
+        for section, article_id in diffs['missing']:
+            print('  - [{}] {}'.format(section, article_id))
+        for section, article_id in diffs['extra']:
+            print('  + [{}] {}'.format(section, article_id))
+    for msg in error_msgs:
+        print(msg)
+
+
+# If running this code as a script:
+if __name__ == '__main__':
+    main(sys.argv)
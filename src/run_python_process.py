@@ -8,7 +8,6 @@ No input is required.
 """
 
 import sys
-import boto3
 import json
 
 import auxiliar as aux
@@ -32,12 +31,8 @@ def run_python_process():
     event_list = [event1, event2]
     #event_list = [event1]
     
-    # Instantiate client:
-    credentials = aux.load_aws_credentials()
-    lamb = boto3.client('lambda', 
-                        aws_access_key_id=credentials['aws_access_key_id'], 
-                        aws_secret_access_key=credentials['aws_secret_access_key'],
-                        region_name='us-east-1')
+    # Get shared client:
+    lamb = aux.get_aws_client('lambda', region_name='us-east-1')
     
     # Loop for invoking processing:
     for event in event_list:
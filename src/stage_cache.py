@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Stale-while-revalidate cache for the article counts of each step
+of the DOU capture pipeline (see `count_DOU_articles.py`).
+
+Each step has its own time-to-live. When asked for a step, the cache
+returns right away the last successful counts (and their age) and, if
+they are older than the step's TTL, recounts the step in a background
+thread. A step that fails keeps serving its last successful counts.
+"""
+
+import threading
+import time
+from functools import partial
+
+import count_DOU_articles as ca
+import stage_stats as ss
+
+
+### Classes ###
+
+class StageCache(object):
+    """
+    Stale-while-revalidate cache of the counts of the capture
+    pipeline steps.
+
+    Parameters
+    ----------
+    ttls : dict
+        Time-to-live (in seconds) of the counts of each step,
+        keyed by step name.
+    default_ttl : float
+        Time-to-live (in seconds) of steps not listed in `ttls`.
+    on_update : callable or None
+        Function called as `on_update(step_name, counts, duration)`
+        after each successful recount, e.g. to store the counts.
+        Its errors are ignored.
+    """
+
+    def __init__(self, ttls, default_ttl=120, on_update=None):
+        self.ttls        = ttls
+        self.default_ttl = default_ttl
+        self.on_update   = on_update
+        self.entries     = {}
+        self.lock        = threading.Lock()
+        self.updated     = threading.Condition(self.lock)
+
+    def _entry(self, key):
+        """
+        Return the cache entry for `key`, creating an empty one
+        if needed (call it holding the lock).
+        """
+        if key not in self.entries:
+            self.entries[key] = {'counts': None, 'updated': None, 'error': None, 'thread': None}
+        return self.entries[key]
+
+    def _run(self, key, job):
+        """
+        Run `job` and store its result (or error) under `key`.
+        """
+        start = time.time()
+        try:
+            counts = job()
+        except Exception as e:
+            with self.lock:
+                self.entries[key]['error'] = e
+                self.updated.notify_all()
+            return
+
+        finished = time.time()
+        with self.lock:
+            self.entries[key].update({'counts': counts, 'updated': finished, 'error': None})
+            self.updated.notify_all()
+
+        if self.on_update != None:
+            try:
+                self.on_update(key[-1], counts, finished - start)
+            except Exception:
+                pass
+
+    def refresh(self, key, job):
+        """
+        Start recounting the step identified by `key` (tuple
+        ending with the step name) by running `job` (callable
+        with no arguments) in a background thread, unless it is
+        already being recounted. Return the thread.
+        """
+        with self.lock:
+            entry = self._entry(key)
+            if entry['thread'] == None or not entry['thread'].is_alive():
+                entry['thread'] = threading.Thread(target=self._run, args=(key, job), daemon=True)
+                entry['thread'].start()
+            return entry['thread']
+
+    def is_stale(self, key):
+        """
+        Whether the counts under `key` (tuple ending with the step
+        name) are missing or older than the step's TTL.
+        """
+        ttl = self.ttls.get(key[-1], self.default_ttl)
+        with self.lock:
+            updated = self._entry(key)['updated']
+        return updated == None or time.time() - updated > ttl
+
+    def wait_for_update(self, timeout=None):
+        """
+        Block until any recount finishes (successfully or not)
+        or until `timeout` seconds (float or None) elapse.
+        """
+        with self.updated:
+            self.updated.wait(timeout)
+
+    def get(self, key, job, wait=False):
+        """
+        Return the cached state of the step identified by `key`
+        (tuple ending with the step name), recounting it in the
+        background with `job` (callable with no arguments) if
+        its counts are stale. If `wait` is True and the step was
+        never counted, wait for the recount to finish.
+
+        Returns a dict with the last successful 'counts' (dict
+        or None), their 'age' (in seconds, or None), the last
+        'error' (Exception or None) and whether the step is
+        being recounted ('refreshing').
+        """
+        if self.is_stale(key):
+            thread = self.refresh(key, job)
+            with self.lock:
+                never_counted = self.entries[key]['counts'] == None
+            if wait and never_counted:
+                thread.join()
+
+        return self.state(key)
+
+    def state(self, key):
+        """
+        Return the cached state of the step identified by `key`
+        (tuple ending with the step name), as `get`, without 
+        recounting it.
+        """
+        with self.lock:
+            entry = self._entry(key)
+            state = {'counts':     entry['counts'],
+                     'age':        None if entry['updated'] == None else time.time() - entry['updated'],
+                     'error':      entry['error'],
+                     'refreshing': entry['thread'] != None and entry['thread'].is_alive()}
+
+        return state
+
+
+### Funções ###
+
+def format_age(age):
+    """
+    Return a short str describing an `age` in seconds
+    (float or None).
+    """
+
+    if age == None:
+        return '-'
+    if age < 60:
+        return '{:.0f} s'.format(age)
+    return '{:.0f} min'.format(age / 60)
+
+
+def pending_counts(step_name, placeholder='...'):
+    """
+    Return a counts dict for the capture pipeline step 
+    `step_name` (str) that is still being counted for 
+    the first time, filled with `placeholder` (str).
+    """
+
+    counts = {key: placeholder for key in ['1', '2', '3', 'e', 'total', 'tot-3']}
+    counts['source'] = step_name
+
+    return counts
+
+
+def cached_pipeline_counts(cache, wait=True, pending=None, refresh=True):
+    """
+    Build the DataFrame of article counts at each step of the
+    capture pipeline (as `count_DOU_articles.count_through_pipeline()`)
+    out of the `cache` (StageCache), recounting stale steps in
+    the background.
+
+    Input
+    -----
+    cache : StageCache
+        The cache of the pipeline steps' counts.
+    wait : bool
+        Whether to wait for the steps that were never counted.
+        If False, these steps are shown with placeholders.
+    pending : list or None
+        If a list, the names of the steps still being counted
+        (those shown with placeholders and those whose older 
+        counts are shown while they are recounted) are appended
+        to it.
+    refresh : bool
+        Whether to recount the stale steps. If False, only 
+        read the cache (e.g. when polling for the steps 
+        already being recounted).
+
+    Return
+    ------
+    df : DataFrame
+        The counts for each section and pipeline step, with an
+        extra column 'Atualizado há' containing the age of the
+        counts and another, 'Desempenho', describing the time, 
+        API calls, bytes and retries of the last successful
+        recount.
+    error_msgs : list of str
+        The error messages of the steps that failed in their
+        last recount.
+    """
+
+    # Hard-coded & settings:
+    all_sections = ['1', '2', '3', 'e']
+    current_date = ca.brasilia_day()
+    date_key     = current_date.strftime('%Y-%m-%d')
+
+    stages = ca.capture_stages(current_date, all_sections, parallel=True)
+    jobs   = [partial(ca.count_stage, name, counter, args, all_sections) for name, counter, args in stages]
+
+    # Start recounting all stale steps at once:
+    if refresh:
+        for (name, counter, args), job in zip(stages, jobs):
+            if cache.is_stale((date_key, name)):
+                cache.refresh((date_key, name), job)
+
+    # Gather the counts in the pipeline order:
+    counts     = []
+    error_msgs = []
+    ages       = []
+    step_stats = []
+    for (name, counter, args), job in zip(stages, jobs):
+        state = cache.get((date_key, name), job, wait=wait) if refresh else cache.state((date_key, name))
+        if state['counts'] != None:
+            counts.append(state['counts'])
+            if state['error'] != None:
+                error_msgs.append('Failed {} capture: {} (showing counts from {} ago)'.format(name, str(state['error']), format_age(state['age'])))
+        elif state['error'] == None:
+            # Still being counted for the first time:
+            counts.append(pending_counts(name))
+            if pending != None:
+                pending.append(name)
+        else:
+            ca.failed_capture_actions(name, error_msgs, counts, state['error'])
+        if pending != None and state['refreshing'] and name not in pending:
+            # Showing older counts while recounting:
+            pending.append(name)
+        ages.append(format_age(state['age']))
+        step_stats.append(ss.format_stats(None if state['counts'] == None else state['counts'].get('stats')))
+
+    # Cria dataframe:
+    df = ca.counts_to_dataframe(counts)
+    df['Atualizado há'] = ages
+    df['Desempenho']    = step_stats
+
+    return df, error_msgs
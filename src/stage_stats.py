@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lightweight instrumentation of the steps of the DOU capture pipeline
+(see `count_DOU_articles.py`).
+
+A step's statistics (wall time, number of API calls or result pages,
+bytes received and retries) are kept in a dict set as the current
+statistics of the running context. The backend functions report their
+calls to it with `record()`, also from the threads started by the step,
+as long as they are submitted with `submit()`. The bytes and retries of
+a step are None (not measured) if any of its calls could not report them
+(e.g. the Google Storage and BigQuery clients do not expose them).
+"""
+
+import threading
+import contextvars
+
+
+# Statistics of the step running in the current context (dict or None):
+current_stats = contextvars.ContextVar('current_stats', default=None)
+stats_lock    = threading.Lock()
+
+
+### Funções ###
+
+def new_stats():
+    """
+    Return an empty dict of step statistics.
+    """
+
+    return {'time': 0.0, 'calls': 0, 'bytes': 0, 'retries': 0}
+
+
+def record(calls=1, n_bytes=None, retries=None):
+    """
+    Add `calls` API calls (or result pages), `n_bytes` bytes
+    received and `retries` retries to the statistics of the
+    step running in the current context, if any. If `n_bytes`
+    or `retries` is None (not measured), the step's total 
+    becomes None.
+    """
+
+    stats = current_stats.get()
+    if stats == None:
+        return
+
+    with stats_lock:
+        stats['calls'] += calls
+        for key, value in [('bytes', n_bytes), ('retries', retries)]:
+            stats[key] = None if value == None or stats[key] == None else stats[key] + value
+
+
+def record_aws_response(response):
+    """
+    Record an AWS API call to the current step statistics,
+    given its `response` (dict returned by boto3).
+    """
+
+    metadata = response.get('ResponseMetadata', {})
+    n_bytes  = int(metadata.get('HTTPHeaders', {}).get('content-length', 0))
+    record(1, n_bytes, metadata.get('RetryAttempts', 0))
+
+
+def submit(executor, func, *args):
+    """
+    Submit `func(*args)` to `executor` (concurrent.futures
+    Executor) so it runs in a copy of the current context,
+    reporting its calls to the current step statistics.
+    Returns a Future.
+    """
+
+    context = contextvars.copy_context()
+
+    return executor.submit(context.run, func, *args)
+
+
+def format_stats(stats):
+    """
+    Return a short str describing the step statistics `stats`
+    (dict or None).
+    """
+
+    if stats == None:
+        return '-'
+
+    kbytes  = 'n/d' if stats['bytes'] == None else '{:.0f}'.format(stats['bytes'] / 1024)
+    retries = 'n/d' if stats['retries'] == None else stats['retries']
+
+    return '{:.1f} s, {} chamadas, {} kB, {} retentativas'.format(stats['time'], stats['calls'], kbytes, retries)
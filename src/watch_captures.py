@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Follow the DOU capture pipeline (see `count_DOU_articles.py`) along
+the morning without anyone clicking 'Mapear', storing the counts
+snapshots (see `capture_snapshots.py`).
+
+Each step is recounted on its own schedule: while its total is below
+the website's, it is polled every MIN_INTERVAL seconds; once it matches
+it, the interval doubles at each poll, up to MAX_INTERVAL. The website
+itself backs off while its total does not change, and so do the
+DynamoDB steps, whose totals count every article ever captured and
+cannot be compared to the website's. A step whose total stays below
+the website's without changing for STALL_AFTER seconds is reported
+as stalled.
+
+Usage: watch_captures.py [UNTIL [MIN_INTERVAL MAX_INTERVAL STALL_AFTER]]
+
+UNTIL (format HH:MM, Brasilia time) defaults to 09:30. The intervals
+default to 30, 900 and 600 seconds.
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import datetime as dt
+
+import count_DOU_articles as ca
+import capture_snapshots as cs
+
+
+# Hard-coded:
+reference_step = 'Site'
+
+
+### Funções ###
+
+def print_event(event):
+    """
+    Print a watch `event` (dict) to screen, in one line.
+    """
+
+    time_str = event['time'].strftime('%H:%M:%S')
+    if event['type'] == 'stall':
+        msg = '{} parado em {} de {} matérias há {:.0f} min'.format(event['stage'], event['count'], event['reference_count'],
+                                                                   event['stalled_for'] / 60)
+    elif event['type'] == 'converged':
+        msg = '{} alcançou o total do {} ({} matérias)'.format(event['stage'], reference_step, event['count'])
+    else:
+        msg = 'Failed {} capture: {}'.format(event['stage'], event['error'])
+    print('{} [{}] {}'.format(time_str, event['type'], msg), flush=True)
+
+
+def poll_stages(stages, all_sections):
+    """
+    Count the capture pipeline `stages` (list of (step name,
+    counter, args) tuples) at once, each in its own thread, and
+    return a dict from step name to a tuple (counts dict or None,
+    Exception or None, step statistics dict).
+    """
+
+    stats = {}
+    with ThreadPoolExecutor(max_workers=max(len(stages), 1)) as executor:
+        futures = [executor.submit(ca.count_stage, name, counter, args, all_sections, None, stats) for name, counter, args in stages]
+
+    results = {}
+    for (name, counter, args), future in zip(stages, futures):
+        try:
+            results[name] = (future.result(), None, stats[name])
+        except Exception as e:
+            results[name] = (None, e, stats[name])
+
+    return results
+
+
+def next_interval(interval, converged, min_interval, max_interval):
+    """
+    Return the time (in seconds) to wait before polling again
+    a step last polled after `interval` seconds: `min_interval`
+    if the step has not `converged` (bool), or twice `interval`
+    (limited to `max_interval`) otherwise.
+    """
+
+    if converged:
+        return min(2 * interval, max_interval)
+
+    return min_interval
+
+
+def update_schedule(state, results, polled_at, min_interval, max_interval, stall_after):
+    """
+    Update the watch `state` (dict from step name to dict with
+    the step's schedule) of the steps polled at `polled_at` 
+    (float, epoch seconds) with their `results` (as returned by
+    `poll_stages`), and return the list of events (dicts) they
+    raised: a step that stalled ('stall'), reached the website's
+    total ('converged') or failed ('error'). The other arguments
+    are described in `watch_captures`.
+    
+    The website and the `count_DOU_articles.growth_steps` (whose
+    totals are not comparable to the website's) are considered converged
+    while their totals do not change; the other steps, once 
+    their totals reach the website's.
+    """
+
+    events = []
+    # The website first, since it is the reference:
+    for name in sorted(results, key=lambda name: name != reference_step):
+        counts, error, stats = results[name]
+        step = state[name]
+        if error != None:
+            events.append({'type': 'error', 'time': ca.brasilia_now(), 'stage': name, 'error': str(error)})
+            step.update({'interval': min_interval, 'next': polled_at + min_interval})
+            continue
+
+        changed = counts['total'] != step['count']
+        if changed:
+            step.update({'count': counts['total'], 'changed': polled_at, 'stalled': False})
+
+        if name == reference_step or name in ca.growth_steps:
+            converged = not changed
+        else:
+            reference_count = state[reference_step]['count']
+            converged = reference_count != None and step['count'] >= reference_count
+            if converged and not step['converged']:
+                events.append({'type': 'converged', 'time': ca.brasilia_now(), 'stage': name, 'count': step['count']})
+            # Report steps stuck below the website's total:
+            stalled_for = polled_at - step['changed']
+            if not converged and not step['stalled'] and reference_count != None and stalled_for >= stall_after:
+                step['stalled'] = True
+                events.append({'type': 'stall', 'time': ca.brasilia_now(), 'stage': name, 'count': step['count'],
+                               'reference_count': reference_count, 'stalled_for': stalled_for})
+
+        step['converged'] = converged
+        step['interval']  = next_interval(step['interval'], converged, min_interval, max_interval)
+        step['next']      = polled_at + step['interval']
+
+    return events
+
+
+def new_state(stages, min_interval):
+    """
+    Return the initial watch state (dict from step name to dict
+    with the step's schedule) of the capture pipeline `stages`
+    (list of (step name, counter, args) tuples), all due now.
+    """
+
+    return {name: {'next': 0.0, 'interval': min_interval, 'count': None, 'changed': None,
+                   'converged': False, 'stalled': False} for name, counter, args in stages}
+
+
+def watch_captures(until, min_interval=30, max_interval=900, stall_after=600, on_event=print_event,
+                   db_path=cs.default_db_path):
+    """
+    Poll the steps of today's capture pipeline until `until`
+    (datetime, Brasilia time), each one at an adaptive interval,
+    storing every successful count in the snapshots database.
+
+    Input
+    -----
+    until : datetime
+        When to stop watching (Brasilia time).
+    min_interval : float
+        Seconds between polls of a step whose total is still
+        below the website's (or, for the website, changing).
+    max_interval : float
+        Maximum seconds between polls of a step that already
+        matches the website's total.
+    stall_after : float
+        Seconds a step may stay below the website's total
+        without changing before it is reported as stalled.
+    on_event : callable
+        Called with a dict describing each event: a step that
+        stalled ('stall'), reached the website's total
+        ('converged') or failed ('error').
+    db_path : str
+        Path to the SQLite snapshots database.
+    """
+
+    # Hard-coded & settings:
+    all_sections = ['1', '2', '3', 'e']
+    current_date = ca.brasilia_day()
+
+    state = new_state(ca.capture_stages(current_date, all_sections, parallel=True), min_interval)
+
+    while ca.brasilia_now() < until:
+
+        # Recount only the steps that are due (BigQuery queries are shared within each round):
+        now     = time.time()
+        stages  = ca.capture_stages(current_date, all_sections, parallel=True)
+        due     = [stage for stage in stages if state[stage[0]]['next'] <= now]
+        results = poll_stages(due, all_sections)
+
+        # Store the new counts:
+        counts    = [counts for counts, error, stats in results.values() if counts != None]
+        durations = {name: stats['time'] for name, (counts, error, stats) in results.items()}
+        if len(counts) > 0:
+            cs.save_snapshot(ca.counts_to_dataframe(counts), durations, current_date, ca.brasilia_now(), db_path)
+
+        # Update each step's schedule:
+        for event in update_schedule(state, results, time.time(), min_interval, max_interval, stall_after):
+            on_event(event)
+
+        # Sleep until the next step is due (or the end):
+        next_poll = min(step['next'] for step in state.values())
+        remaining = (until - ca.brasilia_now()).total_seconds()
+        time.sleep(max(0.0, min(next_poll - time.time(), remaining)))
+
+
+def main(args=['script_filename']):
+    """
+    Function that runs this file as a script.
+    `args` (list of str) can be passed to it
+    using sys.argv. Set `n_args` below to
+    the number of arguments the script accepts.
+    """
+    # Hard-coded:
+    n_args = [0, 1, 4]
+
+    # Docstring output:
+    if len(args) - 1 not in n_args:
+        print(__doc__)
+        sys.exit(1)
+
+    # START OF SCRIPT:
+    until_str = '09:30' if len(args) == 1 else args[1]
+    until_time = dt.datetime.strptime(until_str, '%H:%M')
+    until = ca.brasilia_day().replace(hour=until_time.hour, minute=until_time.minute)
+
+    if len(args) == 5:
+        watch_captures(until, float(args[2]), float(args[3]), float(args[4]))
+    else:
+        watch_captures(until)
+
+
+# If running this code as a script:
+if __name__ == '__main__':
+    main(sys.argv)
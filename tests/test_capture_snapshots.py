@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the capture trends computed by `capture_snapshots.py`
+over a temporary snapshots database.
+"""
+
+import os
+import sys
+import datetime as dt
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+import capture_snapshots as cs
+
+
+def counts_df(totals):
+    """
+    Return a counts DataFrame (as displayed in the app) with
+    the 'Total' of each step given in `totals` (dict from step
+    name to int).
+    """
+    return pd.DataFrame({'Total': totals}).rename_axis('Estágio')
+
+
+def test_whole_table_dynamo_counts_are_left_out_of_trends(tmp_path):
+    db_path  = str(tmp_path / 'snapshots.db')
+    data_pub = dt.datetime(2021, 9, 15)
+
+    # Dynamo tables hold every URL ever captured (250000), the website lists 300 articles:
+    totals = {'Site': 300, 'Gabi (bot no Slack)': 250000, 'Sistema de captura': 250000, 'Cloud da Amazon': 120}
+    cs.save_snapshot(counts_df(totals), {}, data_pub, dt.datetime(2021, 9, 15, 6, 0), db_path)
+    totals['Cloud da Amazon'] = 300
+    cs.save_snapshot(counts_df(totals), {}, data_pub, dt.datetime(2021, 9, 15, 7, 30), db_path)
+
+    trends = cs.catch_up_times(data_pub, db_path=db_path)
+    assert list(trends.index) == ['Cloud da Amazon']
+    assert cs.trend_messages(data_pub, db_path=db_path) == ['Cloud da Amazon alcançou o total do Site às 07:30']
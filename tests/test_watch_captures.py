@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the adaptive schedule of `watch_captures.py`, with fake
+step results (no backend is called).
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+import watch_captures as wc
+
+
+def fake_results(totals):
+    """
+    Return results as given by `poll_stages` for steps whose
+    totals are given in `totals` (dict from step name to int).
+    """
+    return {name: ({'total': total}, None, {'time': 0.0}) for name, total in totals.items()}
+
+
+def test_whole_table_dynamo_counts_do_not_converge_to_website():
+    steps = ['Site', 'Gabi (bot no Slack)', 'Sistema de captura', 'Cloud da Amazon']
+    state = wc.new_state([(name, None, ()) for name in steps], 30)
+
+    # Dynamo tables hold every URL ever captured (100), the website lists 8 articles:
+    events = []
+    for polled_at, s3_total, dynamo_total in [(0, 2, 100), (30, 2, 101), (60, 2, 101), (700, 2, 101)]:
+        totals = {'Site': 8, 'Gabi (bot no Slack)': dynamo_total, 'Sistema de captura': dynamo_total,
+                  'Cloud da Amazon': s3_total}
+        events += wc.update_schedule(state, fake_results(totals), polled_at, 30, 900, 600)
+
+    dynamo_events = [e for e in events if e['stage'] in wc.ca.growth_steps]
+    assert dynamo_events == []
+    # The S3 step is still below the website's total, so it stalls:
+    assert [(e['type'], e['stage']) for e in events] == [('stall', 'Cloud da Amazon')]
+    assert state['Cloud da Amazon']['interval'] == 30
+
+
+def test_dynamo_steps_back_off_only_while_unchanged():
+    state = wc.new_state([('Site', None, ()), ('Gabi (bot no Slack)', None, ())], 30)
+
+    wc.update_schedule(state, fake_results({'Site': 8, 'Gabi (bot no Slack)': 100}), 0, 30, 900, 600)
+    assert state['Gabi (bot no Slack)']['interval'] == 30
+
+    wc.update_schedule(state, fake_results({'Site': 8, 'Gabi (bot no Slack)': 100}), 30, 30, 900, 600)
+    assert state['Gabi (bot no Slack)']['interval'] == 60
+
+    # New items captured: poll often again:
+    wc.update_schedule(state, fake_results({'Site': 8, 'Gabi (bot no Slack)': 105}), 90, 30, 900, 600)
+    assert state['Gabi (bot no Slack)']['interval'] == 30
+    assert state['Gabi (bot no Slack)']['converged'] == False